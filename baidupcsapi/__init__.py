@@ -6,4 +6,13 @@ __version__ = '0.2.12'
 __author__ = 'mozillazg,latyas'
 __license__ = 'MIT'
 
-from .api import PCS
\ No newline at end of file
+from .api import PCS, PCSError
+from .fingerprint import Fingerprint, FingerprintCache
+from .asyncpcs import AsyncPCS
+from .hosts import HostSelector
+from .cache import MetaCache
+from .batch import FileManagerBatch
+from .retry import RetryPolicy
+from .limiter import AdaptiveLimiter
+from .results import Result, FileEntry, Task, Quota, FileList, MetaList, TaskList
+from .listing import FileTable, FileRow
@@ -10,24 +10,66 @@ import logging
 import pickle
 import string
 import random
+import posixpath
+import threading
+import itertools
+import collections
+import shutil
+import Queue
+from cStringIO import StringIO
+from multiprocessing.pool import ThreadPool
 from hashlib import sha1,md5
 from urllib import urlencode, quote
-from zlib import crc32
+from urlparse import urlparse
 from requests_toolbelt import MultipartEncoder
 import requests
+from requests.adapters import HTTPAdapter
 import bencode
+from journal import UploadJournal, DownloadJournal
+from fingerprint import Fingerprint, block_size_for
+from hosts import HostSelector
+from sync import scan_local, scan_remote, plan_up, plan_down
+from batch import FileManagerBatch, BATCH_SIZE
+from retry import RetryPolicy, is_idempotent, is_congested
+from limiter import AdaptiveLimiter
+from results import (decode_json, Quota, FileResult, FileList, MetaList,
+                     TaskList)
+from listing import FileTable
 '''
 logging.basicConfig(level=logging.DEBUG,
                 format='%(asctime)s %(filename)s[line:%(lineno)d] %(levelname)s %(message)s',
                 datefmt='%a, %d %b %Y %H:%M:%S')
 '''
 BAIDUPAN_SERVER = 'pan.baidu.com'
+# 获取 pcs 服务器列表的入口，实际使用的服务器见 PCS.pcs_server （每个实例单独选择）
 BAIDUPCS_SERVER = 'pcs.baidu.com'
 
 #https://pcs.baidu.com/rest/2.0/pcs/manage?method=listhost -> baidu cdn
 # uses CDN_DOMAIN/monitor.jpg to test speed for each CDN
 api_template = 'http://%s/api/{0}' % BAIDUPAN_SERVER
 
+# meta_batch 每次 filemetas 请求包含的最多路径数
+META_BATCH_SIZE = 100
+
+# 分段下载时每个 Range 请求的大小及写入本地文件的缓冲大小
+PART_SIZE = 8 * 2 ** 20
+CHUNK_SIZE = 64 * 1024
+
+# 各服务器的连接池大小，pcs 为当前选择的 pcs 服务器
+POOL_SIZES = {
+    'pan': 10,
+    'pcs': 10,
+    'passport': 2,
+    'default': 10,
+}
+POOL_HOSTS = {
+    'pan': BAIDUPAN_SERVER,
+    'passport': 'passport.baidu.com',
+}
+
+# 缓存选择的 pcs 服务器的文件
+PCS_SERVER_CACHE = '.pcs-server'
+
 class LoginFailed(Exception):
     """因为帐号原因引起的登录失败异常
     如果是超时则是返回Timeout的异常
@@ -49,6 +91,21 @@ class CancelledError(Exception):
     __repr__ = __str__
 
 
+class PCSError(Exception):
+    """PCS 接口返回错误
+    组合操作（分片上传等）中某一步请求失败时抛出，response 为出错的请求
+    """
+    def __init__(self, msg, response=None):
+        self.msg = msg
+        self.response = response
+        Exception.__init__(self, msg)
+
+    def __str__(self):
+        return self.msg
+
+    __repr__ = __str__
+
+
 class BufferReader(MultipartEncoder):
     """将multipart-formdata转化为stream形式的Proxy类
     """
@@ -78,27 +135,98 @@ def check_login(func):
     """
     @wraps(func)
     def wrapper(*args, **kwargs):
+        generation = args[0]._login_generation
         ret = func(*args, **kwargs)
-        if type(ret) == requests.Response:
+        # 流式响应（如 download_file 的分段下载）的内容还没有读取，
+        # 读取会把整个响应缓存在内存中，不检查
+        if type(ret) == requests.Response and ret._content is not False:
             try:
-                foo = json.loads(ret.content)
+                # 解析结果保存在 ret 上，调用者不需要再次解析
+                foo = decode_json(ret)
                 if foo.has_key('errno') and foo['errno'] == -6:
-                    logging.debug('Offline, deleting cookies file then relogin.')
-                    path = '.{0}.cookies'.format(args[0].username)
-                    if os.path.exists(path):
-                        os.remove(path)
-                    args[0]._initiate()
+                    args[0]._relogin(generation)
             except:
                 pass
         return ret
     return wrapper
 
 
+def typed_result(result_type):
+    """PCS 的 typed 为 True 或调用时指定 typed=True 时，把返回的 Response 包装为 result_type
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            typed = kwargs.pop('typed', None)
+            ret = func(self, *args, **kwargs)
+            if typed is None:
+                typed = self.typed
+            if typed and isinstance(ret, requests.Response):
+                return result_type(ret)
+            return ret
+        return wrapper
+    return decorator
+
+
+def _is_download(params):
+    return params.get('method') == 'download'
+
+
+def _release_on_close(response, release):
+    """流式响应的内容读完（iter_content 结束）或关闭时调用一次 release
+    """
+    lock = threading.Lock()
+    released = []
+
+    def _release():
+        with lock:
+            if released:
+                return
+            released.append(True)
+        release()
+
+    close = response.close
+    iter_content = response.iter_content
+
+    def _close():
+        try:
+            close()
+        finally:
+            _release()
+
+    def _iter_content(*args, **kwargs):
+        try:
+            for chunk in iter_content(*args, **kwargs):
+                yield chunk
+        finally:
+            _release()
+
+    response.close = _close
+    response.iter_content = _iter_content
+
+
 class BaseClass(object):
     """提供PCS类的基本方法
     """
-    def __init__(self, username, password, api_template=api_template, captcha_func=None):
-        self.session = requests.session()
+    def __init__(self, username, password, api_template=api_template, captcha_func=None,
+                 pool_sizes=None, lazy=False, cache_ttl=3600, retry_policy=None,
+                 adaptive=True):
+        # 每个线程使用自己的 session，共用 cookies 和连接池
+        self._local = threading.local()
+        self._cookies = requests.cookies.RequestsCookieJar()
+        self._adapters = []
+        self._adapters_generation = 0
+        self._login_generation = 0
+        self.pool_sizes = dict(POOL_SIZES)
+        self._init_lock = threading.RLock()
+        self.pcs_server = None
+        self.host_selector = HostSelector()
+        self._last_probe = 0
+        # pan.baidu.com 的元数据请求和 pcs 服务器的数据传输分别限制并发数
+        self.limiters = {}
+        if adaptive:
+            self.limiters = {'pan': AdaptiveLimiter(), 'pcs': AdaptiveLimiter()}
+        self.configure_pools(**(pool_sizes or {}))
         self.api_template = api_template
         self.username = username
         self.password = password
@@ -108,31 +236,154 @@ class BaseClass(object):
             self.captcha_func = captcha_func
         else:
             self.captcha_func = self.show_captcha
-        # 设置pcs服务器
-        logging.debug('setting pcs server')
-        self.set_pcs_server(self.get_fastest_pcs_server())
-        self._initiate()
-
-    def get_fastest_pcs_server_test(self):
+        self.cache_ttl = cache_ttl
+        self.retry_policy = RetryPolicy() if retry_policy is None else retry_policy
+        self._initiated = False
+        if not lazy:
+            self.prepare()
+
+    @property
+    def session(self):
+        """当前线程使用的 requests.Session
+
+        PCS 对象可以在多个线程中同时使用：每个线程有自己的 session，
+        它们共用同一个 cookies 和同一组连接池。
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.session()
+            session.cookies = self._cookies
+            self._local.session = session
+            self._local.generation = None
+        if self._local.generation != self._adapters_generation:
+            with self._init_lock:
+                for prefix, adapter in self._adapters:
+                    session.mount(prefix, adapter)
+                self._local.generation = self._adapters_generation
+        return session
+
+    def _mount(self, prefix, adapter):
+        with self._init_lock:
+            old = [a for p, a in self._adapters if p == prefix]
+            self._adapters = [(p, a) for p, a in self._adapters if p != prefix]
+            self._adapters.append((prefix, adapter))
+            self._adapters_generation += 1
+            # 关闭不再使用的连接池
+            for foo in old:
+                if not any(a is foo for p, a in self._adapters):
+                    foo.close()
+
+    def _mounted_size(self, prefix):
+        for p, adapter in self._adapters:
+            if p == prefix:
+                return adapter._pool_maxsize
+        return None
+
+    def _relogin(self, generation):
+        """登录失效时重新登录，多个线程同时发现时只登录一次
+        """
+        with self._init_lock:
+            if generation != self._login_generation:
+                return
+            logging.debug('Offline, deleting cookies file then relogin.')
+            for path in ('.{0}.cookies'.format(self.username),
+                         '.{0}.token'.format(self.username)):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._initiate()
+            self._login_generation += 1
+
+    def prepare(self, wait=True):
+        """选择 pcs 服务器并登录
+
+        非 lazy 模式下在初始化时调用；lazy 模式下在第一次请求时自动调用，
+        也可以提前调用。
+
+        :param wait: 为 False 时在后台线程中进行，立即返回该线程
+        """
+        if not wait:
+            thread = threading.Thread(target=self._prepare_background)
+            thread.daemon = True
+            thread.start()
+            return thread
+        self._pcs_host()
+        self._ensure_login()
+
+    def _prepare_background(self):
+        try:
+            self.prepare()
+        except Exception as e:
+            # 第一次请求时会重试
+            logging.warning('prepare in background failed: %s' % e)
+
+    def _ensure_login(self):
+        if not self._initiated:
+            with self._init_lock:
+                if not self._initiated:
+                    self._initiate()
+                    self._initiated = True
+
+    def _pcs_host(self):
+        """返回当前的 pcs 服务器，还没有选择时先选择
+        """
+        if self.pcs_server is None:
+            with self._init_lock:
+                if self.pcs_server is None:
+                    # 设置pcs服务器
+                    logging.debug('setting pcs server')
+                    self.set_pcs_server(self._cached_pcs_server())
+        return self.pcs_server
+
+    def _load_cache(self, path):
+        """读取 cache_ttl 内写入的缓存文件，没有或过期时返回 None
+        """
+        if not self.cache_ttl or not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                foo = json.load(f)
+        except ValueError:
+            return None
+        if time.time() - foo.get('time', 0) > self.cache_ttl:
+            return None
+        return foo.get('value')
+
+    def _save_cache(self, path, value):
+        if not self.cache_ttl:
+            return
+        try:
+            with open(path, 'w') as f:
+                json.dump({'time': time.time(), 'value': value}, f)
+        except IOError as e:
+            logging.debug('can not write %s: %s' % (path, e))
+
+    def _cached_pcs_server(self):
+        server = self._load_cache(PCS_SERVER_CACHE)
+        if server is None:
+            server = self.get_fastest_pcs_server()
+            self._save_cache(PCS_SERVER_CACHE, server)
+        return server
+
+    def get_fastest_pcs_server_test(self, timeout=3.0):
         """通过测试返回最快的pcs服务器
+
+        并发测试 listhost 返回的所有服务器，timeout 秒内没有响应的服务器不参与选择。
+        测试结果保存在 ``host_selector`` 中，之后实际传输的延迟和吞吐量会持续更新它，
+        当前服务器变慢或连续出错时自动切换到更快的服务器。
+
+        :param timeout: 测试的最长时间，单位为秒
         :returns: str -- 服务器地址
         """
-        ret = requests.get('https://pcs.baidu.com/rest/2.0/pcs/manage?method=listhost').content
+        self._last_probe = time.time()
+        ret = requests.get('https://%s/rest/2.0/pcs/manage?method=listhost' % BAIDUPCS_SERVER,
+                           timeout=timeout).content
         serverlist = [server['host'] for server in json.loads(ret)['list']]
-        url_pattern = 'http://{0}/monitor.jpg'
-        time_record = []
-        for server in serverlist:
-            start = time.time()*1000
-            requests.get(url_pattern.format(server))
-            end = time.time()*1000
-            time_record.append((end-start,server))
-            logging.info('TEST %s %s ms' % (server,int(end-start)))
-        return min(time_record)[1]
+        return self.host_selector.probe(serverlist, timeout)
 
     def get_fastest_pcs_server(self):
         """通过百度返回设置最快的pcs服务器
         """
-        url = 'http://pcs.baidu.com/rest/2.0/pcs/file?app_id=250528&method=locateupload'
+        url = 'http://%s/rest/2.0/pcs/file?app_id=250528&method=locateupload' % BAIDUPCS_SERVER
         ret = requests.get(url).content
         foo = json.loads(ret)
         return foo['host']
@@ -143,9 +394,132 @@ class BaseClass(object):
 
         .. warning::
             不要加 http:// 和末尾的 /
+
+        .. note::
+            服务器是每个 PCS 对象独立的，不影响同一进程中的其它 PCS 对象
+        """
+        self._mount_pool(server, self.pool_sizes['pcs'])
+        self.pcs_server = server
+
+    def _report_pcs(self, host, latency=None, throughput=None, ok=True):
+        """记录 pcs 服务器的一次请求结果，必要时切换服务器
         """
-        global BAIDUPCS_SERVER
-        BAIDUPCS_SERVER = server
+        selector = self.host_selector
+        selector.record(host, latency=latency, throughput=throughput, ok=ok)
+        if host != self.pcs_server:
+            return
+        better = selector.should_switch(host)
+        if better is not None:
+            logging.info('pcs server %s degraded, switch to %s' % (host, better))
+            self.set_pcs_server(better)
+        elif not selector.available(host) and \
+                time.time() - self._last_probe > selector.cooldown:
+            # 没有其它已知的服务器，在后台重新测试
+            self._last_probe = time.time()
+            thread = threading.Thread(target=self._reprobe)
+            thread.daemon = True
+            thread.start()
+
+    def _reprobe(self):
+        try:
+            server = self.get_fastest_pcs_server_test()
+        except (requests.RequestException, ValueError, KeyError) as e:
+            logging.warning('probe pcs servers failed: %s' % e)
+            return
+        if server and server != self.pcs_server:
+            logging.info('switch pcs server to %s' % server)
+            self.set_pcs_server(server)
+
+    def _mount_pool(self, host, size):
+        """为 host 设置连接池，大小没有变化时保留原来的连接池和其中的连接
+        """
+        prefixes = ['%s%s/' % (scheme, host) for scheme in ('http://', 'https://')]
+        with self._init_lock:
+            if all(self._mounted_size(prefix) == size for prefix in prefixes):
+                return
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=size)
+            for prefix in prefixes:
+                self._mount(prefix, adapter)
+
+    def configure_pools(self, **sizes):
+        """设置各服务器的连接池大小
+
+        pan.baidu.com、pcs 服务器和 passport.baidu.com 各自使用独立的连接池，
+        并发请求时连接池应不小于线程数，否则会出现 "connection pool is full"
+        并重复建立连接。
+
+        :param sizes: 连接池大小，可用的名字有 pan、pcs（当前选择的 pcs 服务器）、
+                      passport 和 default（其它服务器）
+
+        >>> pcs.configure_pools(pcs=32, pan=16)
+
+        .. note::
+            只替换大小改变了的连接池（原来的连接池被关闭），
+            其它连接池和 ``warm_up`` 建立的连接保留。
+        """
+        self.pool_sizes.update(sizes)
+        size = self.pool_sizes['default']
+        if not (self._mounted_size('http://') == size == self._mounted_size('https://')):
+            adapter = HTTPAdapter(pool_maxsize=size)
+            self._mount('http://', adapter)
+            self._mount('https://', adapter)
+        for name, host in POOL_HOSTS.items():
+            self._mount_pool(host, self.pool_sizes[name])
+        if self.pcs_server:
+            self._mount_pool(self.pcs_server, self.pool_sizes['pcs'])
+        for name, limiter in self.limiters.items():
+            limiter.max_limit = self.pool_sizes[name]
+
+    def warm_up(self, connections=None):
+        """预先与当前的 pcs 服务器建立连接
+
+        同时发起 connections 个请求，完成 TCP 和 TLS 握手后连接留在连接池中，
+        之后的并发传输可以直接复用。
+
+        :param connections: 建立的连接数，缺省为 pcs 连接池大小
+        """
+        if connections is None:
+            connections = self.pool_sizes['pcs']
+        url = 'https://{0}/rest/2.0/pcs/manage?method=listhost'.format(self._pcs_host())
+
+        def _get(_):
+            try:
+                self.session.get(url, verify=False).close()
+            except requests.RequestException as e:
+                logging.debug('warm up %s failed: %s' % (self.pcs_server, e))
+
+        pool = ThreadPool(connections)
+        try:
+            pool.map(_get, xrange(connections))
+        finally:
+            pool.terminate()
+
+    def pool_stats(self):
+        """返回各连接池的状态
+
+        :return: list -- 每项为一个 dict，包括 host、scheme、maxsize、
+                 num_connections（建立过的连接数）、num_requests（发出的请求数）
+                 和 idle（池中空闲的连接数）
+        """
+        stats = []
+        adapters = set(adapter for _, adapter in self._adapters)
+        for adapter in adapters:
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                stats.append({
+                    'host': pool.host,
+                    'scheme': pool.scheme,
+                    'maxsize': pool.pool.maxsize if pool.pool else 0,
+                    'num_connections': pool.num_connections,
+                    'num_requests': pool.num_requests,
+                    # 队列中未建立连接的位置为 None
+                    'idle': len([c for c in list(pool.pool.queue) if c is not None])
+                            if pool.pool else 0,
+                })
+        return stats
 
     def _remove_empty_items(self, data):
         for k, v in data.copy().items():
@@ -153,12 +527,14 @@ class BaseClass(object):
                 data.pop(k)
 
     def _initiate(self):
+        token_file = '.{0}.token'.format(self.username)
         if not self._load_cookies():
             self.session.get('http://www.baidu.com')
             self.user['token'] = self._get_token()
             self._login()
         else:
-            self.user['token'] = self._get_token()
+            self.user['token'] = self._load_cache(token_file) or self._get_token()
+        self._save_cache(token_file, self.user['token'])
 
     def _save_cookies(self):
         cookies_file = '.{0}.cookies'.format(self.username)
@@ -173,7 +549,8 @@ class BaseClass(object):
             with open(cookies_file) as cookies_file:
                 cookies = requests.utils.cookiejar_from_dict(pickle.load(cookies_file))
                 logging.debug(str(cookies))
-                self.session.cookies = cookies
+                self._cookies.clear()
+                self._cookies.update(cookies)
                 self.user['BDUSS'] = self.session.cookies['BDUSS']
                 return True
         else:
@@ -257,9 +634,47 @@ class BaseClass(object):
             if isinstance(v,unicode):
                 params[k] = v.encode('utf-8')
 
+    def _load_json(self, ret, action):
+        """解析返回的 json，请求出错时抛出 PCSError
+        """
+        try:
+            foo = decode_json(ret)
+        except ValueError:
+            raise PCSError('%s failed: %s' % (action, ret.content), ret)
+        if foo.get('errno', 0) != 0 or foo.get('error_code'):
+            raise PCSError('%s failed: %s' % (action, ret.content), ret)
+        return foo
+
+    def _iter_pages(self, fetch, key, page_size, prefetch=True):
+        """依次获取每一页并逐条返回
+
+        :param fetch: fetch(page) 返回第 page 页（从0开始）的 Response
+        :param key: 结果列表在返回的 json 中的名字
+        :param prefetch: 返回当前页时在后台获取下一页
+        """
+        pool = ThreadPool(1) if prefetch else None
+        try:
+            page = 0
+            ret = fetch(page)
+            while True:
+                items = self._load_json(ret, 'list page %d' % page).get(key) or []
+                last = len(items) < page_size
+                if not last and pool:
+                    pending = pool.apply_async(fetch, (page + 1,))
+                for item in items:
+                    yield item
+                if last:
+                    return
+                page += 1
+                ret = pending.get() if pool else fetch(page)
+        finally:
+            if pool:
+                pool.terminate()
+
     @check_login
     def _request(self, uri, method=None, url=None, extra_params=None,
-                 data=None, files=None, callback=None, **kwargs):
+                 data=None, files=None, callback=None, retry=None, **kwargs):
+        self._ensure_login()
         params = {
             'method': method,
             'app_id':"250528",
@@ -274,38 +689,139 @@ class BaseClass(object):
         self._params_utf8(params)
         if not url:
             url = self.api_template.format(uri)
-        if data or files:
-
-            if '?' in url:
-                api = "%s&%s" % (url, urlencode(params))
-            else:
-                api = '%s?%s' % (url, urlencode(params))
 
-            #print params
-            if data:
-                self._remove_empty_items(data)
-                response = self.session.post(api, data=data, verify=False,
-                                         **kwargs)
-            else:
-                self._remove_empty_items(files)
+        policy = self.retry_policy if retry is None else retry
+        if not policy:
+            return self._send_limited(uri, url, params, data, files, callback, **kwargs)
+        idempotent = is_idempotent(uri, method, params, data)
+        # 重试前把上传的文件对象移回原来的位置，不能移动时不重试
+        positions = []
+        for value in (files or {}).values():
+            fh = value[1] if isinstance(value, tuple) else value
+            if not (hasattr(fh, 'seek') and hasattr(fh, 'tell')):
+                positions = None
+                break
+            positions.append((fh, fh.tell()))
+        policy.deposit()
+        attempt = 0
+        while True:
+            response = error = None
+            try:
+                response = self._send_limited(uri, url, params, data, files, callback,
+                                              **kwargs)
+            except requests.RequestException as e:
+                error = e
+            should_retry, retry_after = policy.classify(response, error, idempotent,
+                                                        kwargs.get('stream', False))
+            if (not should_retry or attempt >= policy.retries or positions is None or
+                    not policy.withdraw()):
+                if error is not None:
+                    raise error
+                return response
+            delay = policy.delay(attempt, retry_after)
+            logging.debug('retry %s %s in %.2fs (attempt %d): %s' % (
+                uri, method, delay, attempt + 1,
+                error if error is not None else response.status_code))
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+            for fh, pos in positions:
+                fh.seek(pos)
+            attempt += 1
+
+    def _send_limited(self, uri, url, params, data=None, files=None, callback=None,
+                      **kwargs):
+        """在并发限制器允许时发送一次请求，并把结果反馈给限制器
+
+        流式响应收到响应头后就释放限制器，调用者可以任意使用 ``raw`` ；
+        ``_hold_slot=True`` （内部一定会关闭响应的调用者，如 ``_download_ranges``）
+        时读完或关闭响应才释放，使限制器约束同时进行的传输数。
+        """
+        hold = kwargs.pop('_hold_slot', False)
+        host = urlparse(url).netloc
+        limiter = self.limiters.get('pan' if host == BAIDUPAN_SERVER else 'pcs')
+        if limiter is None:
+            return self._send(uri, url, params, data, files, callback, **kwargs)
+        limiter.acquire()
+        start = time.time()
+        try:
+            response = self._send(uri, url, params, data, files, callback, **kwargs)
+        except requests.RequestException as e:
+            limiter.release(None, is_congested(error=e))
+            raise
+        except Exception:
+            limiter.release()
+            raise
+        stream = kwargs.get('stream', False)
+        congested = is_congested(response, stream=stream)
+        # 上传和下载的耗时取决于文件大小，不用于判断延迟是否增加；
+        # 流式响应到这里只收到了响应头，可以作为延迟
+        if files or (_is_download(params) and not stream):
+            latency = None
+        else:
+            latency = time.time() - start
+        if stream and hold:
+            _release_on_close(response, lambda: limiter.release(latency, congested))
+        else:
+            limiter.release(latency, congested)
+        return response
 
-                body = BufferReader(files, callback=callback)
-                headers = {
-                    "Content-Type": body.content_type
-                }
+    def _send(self, uri, url, params, data=None, files=None, callback=None, **kwargs):
+        """发送一次请求
+        """
+        # 记录 pcs 服务器的延迟和吞吐量，用于选择服务器
+        host = urlparse(url).netloc
+        body = None
+        start = time.time()
+        try:
+            if data or files:
+
+                if '?' in url:
+                    api = "%s&%s" % (url, urlencode(params))
+                else:
+                    api = '%s?%s' % (url, urlencode(params))
+
+                #print params
+                if data:
+                    self._remove_empty_items(data)
+                    response = self.session.post(api, data=data, verify=False,
+                                             **kwargs)
+                else:
+                    self._remove_empty_items(files)
+
+                    body = BufferReader(files, callback=callback)
+                    headers = {
+                        "Content-Type": body.content_type
+                    }
 
-                response = self.session.post(api, data=body, verify=False,headers=headers,**kwargs)
-        else:
-            api = url
-            if uri == 'filemanager' or uri == 'rapidupload' or uri == 'filemetas' or uri == 'precreate':
-                response = self.session.post(api, params=params, verify=False, **kwargs)
+                    response = self.session.post(api, data=body, verify=False,headers=headers,**kwargs)
+            else:
+                api = url
+                if uri == 'filemanager' or uri == 'rapidupload' or uri == 'filemetas' or uri == 'precreate':
+                    response = self.session.post(api, params=params, verify=False, **kwargs)
+                else:
+                    response = self.session.get(api, params=params, verify=False, **kwargs)
+        except requests.RequestException:
+            if host == self.pcs_server:
+                self._report_pcs(host, ok=False)
+            raise
+        if host == self.pcs_server:
+            elapsed = time.time() - start
+            if body is not None:
+                self._report_pcs(host, throughput=body._len / max(elapsed, 1e-3),
+                                 ok=response.status_code < 500)
+            elif _is_download(params) and not kwargs.get('stream', False):
+                # 包含了下载整个文件的时间，不是延迟
+                self._report_pcs(host, ok=response.status_code < 500)
             else:
-                response = self.session.get(api, params=params, verify=False, **kwargs)
+                self._report_pcs(host, latency=elapsed, ok=response.status_code < 500)
         return response
 
 
 class PCS(BaseClass):
-    def __init__(self,  username, password, captcha_callback=None):
+    def __init__(self,  username, password, captcha_callback=None,
+                 fingerprint_cache=None, pool_sizes=None, lazy=False, cache_ttl=3600,
+                 meta_cache=None, retry_policy=None, adaptive=True, typed=False):
         """
         :param username: 百度网盘的用户名
         :type username: str
@@ -316,11 +832,75 @@ class PCS(BaseClass):
         :param captcha_callback: 验证码的回调函数
             .. note::
                 该函数会获得一个jpeg文件的内容，返回值需为验证码
+
+        :param fingerprint_cache: （可选）本地文件指纹缓存，
+                                  秒传和分片上传时未修改的文件不再重新计算 md5
+        :type fingerprint_cache: FingerprintCache
+
+        :param pool_sizes: （可选）各服务器的连接池大小，如 ``{'pcs': 32}`` ，
+                           见 ``configure_pools``
+        :type pool_sizes: dict
+
+        :param lazy: 为 True 时初始化不进行任何网络请求，选择 pcs 服务器和登录
+                     在第一次请求时进行，也可以调用 ``prepare(wait=False)``
+                     在后台进行
+        :param cache_ttl: 选择的 pcs 服务器（保存在 ``.pcs-server`` ）和
+                          token（保存在 ``.用户名.token`` ）的缓存时间，
+                          单位为秒，默认为3600，为 0 时不缓存
+
+        :param meta_cache: （可选）网盘文件信息缓存，供 ``stat`` 和 ``listdir`` 使用，
+                           修改文件的方法会自动使受影响的条目失效
+        :type meta_cache: MetaCache
+
+        :param retry_policy: （可选）请求的重试策略，缺省为默认参数的 RetryPolicy ，
+                             为 False 时不重试。调用任何方法时也可以通过
+                             ``retry=`` 参数为单次调用指定
+        :type retry_policy: RetryPolicy
+
+        :param adaptive: 是否自适应地限制并发请求数（见 ``AdaptiveLimiter`` ），默认为 True
+
+        :param typed: 为 True 时 quota、list_files、meta 等方法返回 ``Result``
+                      （如 Quota、FileList）而不是 requests.Response ，
+                      调用时也可以通过 ``typed=`` 参数为单次调用指定
+        """
+        self.typed = typed
+        self.fingerprint_cache = fingerprint_cache
+        self.meta_cache = meta_cache
+        # 计算文件指纹时并行计算分块 md5 的线程数
+        self.hash_workers = 1
+        super(PCS, self).__init__(username, password, api_template,
+                                  captcha_func=captcha_callback,
+                                  pool_sizes=pool_sizes, lazy=lazy,
+                                  cache_ttl=cache_ttl, retry_policy=retry_policy,
+                                  adaptive=adaptive)
+
+    def fingerprint(self, file, block_size=None, workers=None):
+        """计算文件指纹，设置了 fingerprint_cache 时优先使用缓存
+
+        :param file: 本地文件路径或以二进制模式打开的文件对象
+        :param block_size: 分块大小，缺省为4M，文件过大时自动加倍以保证不超过1024块
+        :param workers: 并行计算分块 md5 的线程数，缺省为 ``self.hash_workers``
+        :return: Fingerprint
         """
-        super(PCS, self).__init__(username, password, api_template)
+        if workers is None:
+            workers = self.hash_workers
+        path = file if isinstance(file, basestring) else getattr(file, 'name', None)
+        if (self.fingerprint_cache is not None and isinstance(path, basestring)
+                and os.path.isfile(path)):
+            return self.fingerprint_cache.fingerprint(path, block_size, workers)
+        return Fingerprint.from_file(file, block_size, workers)
 
 
 
+    def _invalidate(self, paths, recursive=False):
+        """修改文件后使 meta_cache 中受影响的条目失效
+        """
+        if self.meta_cache is None:
+            return
+        for path in paths:
+            self.meta_cache.invalidate(path, recursive)
+
+    @typed_result(Quota)
     def quota(self, **kwargs):
         """获得配额信息
         :return requests.Response
@@ -333,6 +913,7 @@ class PCS(BaseClass):
         return self._request('quota', **kwargs)
 
 
+    @typed_result(FileResult)
     def upload(self, dir, file_handler, filename, ondup="newcopy", callback=None, **kwargs):
         """上传单个文件（<2G）.
 
@@ -383,9 +964,11 @@ class PCS(BaseClass):
         tmp_filename = ''.join(random.sample(string.ascii_letters,10))
         files = {'file': (tmp_filename,file_handler)}
 
-        url = 'https://{0}/rest/2.0/pcs/file'.format(BAIDUPCS_SERVER)
-        return self._request('file', 'upload', url=url, extra_params=params,
-                             files=files, callback=callback, **kwargs)
+        url = 'https://{0}/rest/2.0/pcs/file'.format(self._pcs_host())
+        ret = self._request('file', 'upload', url=url, extra_params=params,
+                            files=files, callback=callback, **kwargs)
+        self._invalidate([posixpath.join(dir, filename)])
+        return ret
 
     def upload_tmpfile(self, file_handler, callback=None, **kwargs):
         """分片上传—文件分片及上传.
@@ -436,10 +1019,11 @@ class PCS(BaseClass):
             'type': 'tmpfile'
         }
         files = {'file': (str(int(time.time())),file_handler)}
-        url = 'https://{0}/rest/2.0/pcs/file'.format(BAIDUPCS_SERVER)
+        url = 'https://{0}/rest/2.0/pcs/file'.format(self._pcs_host())
         return self._request('file', 'upload', url=url, extra_params=params,callback=callback,
                              files=files, **kwargs)
 
+    @typed_result(FileResult)
     def upload_superfile(self, remote_path, block_list, ondup="newcopy", **kwargs):
         """分片上传—合并分片文件.
 
@@ -478,11 +1062,192 @@ class PCS(BaseClass):
         data = {
             'param': json.dumps({'block_list': block_list}),
         }
-        url = 'https://{0}/rest/2.0/pcs/file'.format(BAIDUPCS_SERVER)
-        return self._request('file', 'createsuperfile', url=url, extra_params=params,
-                             data=data, **kwargs)
+        url = 'https://{0}/rest/2.0/pcs/file'.format(self._pcs_host())
+        ret = self._request('file', 'createsuperfile', url=url, extra_params=params,
+                            data=data, **kwargs)
+        self._invalidate([remote_path])
+        return ret
 
-    def download(self, remote_path, **kwargs):
+    def upload_file(self, local_path, remote_path, workers=4, block_size=None,
+                    ondup="newcopy", callback=None, resume=False, state_dir=None,
+                    fingerprint=None, **kwargs):
+        """分片并发上传本地文件.
+
+        将文件按 block_size 分块，通过 ``check_file_blocks`` 询问服务器缺少的块，
+        用 workers 个线程并发调用 ``upload_tmpfile`` 上传这些块，
+        最后调用 ``upload_superfile`` 合并。只有一块的文件直接使用 ``upload`` 上传。
+
+        :param local_path: 本地文件路径
+        :param remote_path: 网盘中文件的保存路径（包含文件名），必须以 / 开头。
+        :param workers: 并发上传的线程数，默认为4
+        :param block_size: 分块大小，缺省为4M，文件过大时自动加倍以保证不超过1024块
+        :param ondup: （可选）同 ``upload_superfile``
+        :param callback: 上传进度回调函数
+            需要包含 size 和 progress 名字的参数，size 为需要上传的总字节数
+        :param resume: 是否记录上传日志以便断点续传，默认为 False
+
+            .. note::
+                日志保存在源文件旁的 ``.文件名.pcsupload`` 中，记录文件标识和
+                已上传块的 md5。进程中断后以相同参数再次调用，若文件大小、
+                修改时间和 inode 均未改变，则跳过日志中已上传的块，
+                且不再重新计算它们的 md5。合并成功后日志被删除。
+        :param state_dir: 日志的保存目录，缺省保存在源文件所在目录
+        :param fingerprint: （可选）预先计算好的文件指纹（例如秒传时计算的），
+                            指定时使用其中的分块 md5，不再读取文件计算
+        :type fingerprint: Fingerprint
+
+        :return: requests.Response 对象，同 ``upload_superfile``
+
+        .. note::
+            某个分片上传失败时抛出 PCSError
+        """
+        size = os.path.getsize(local_path)
+        if fingerprint is None and self.fingerprint_cache is not None and not resume:
+            fingerprint = self.fingerprint(local_path, block_size)
+        if fingerprint is not None:
+            block_size = fingerprint.block_size
+        elif block_size is None:
+            block_size = block_size_for(size)
+
+        journal = None
+        if resume:
+            journal = UploadJournal(local_path, remote_path, block_size, state_dir)
+
+        if fingerprint is not None:
+            block_list = list(fingerprint.block_list)
+        else:
+            block_list = []
+            with open(local_path, 'rb') as f:
+                for idx in xrange((size + block_size - 1) // block_size):
+                    block_md5 = journal and journal.get(idx)
+                    if block_md5 is None:
+                        f.seek(idx * block_size)
+                        block_md5 = md5(f.read(block_size)).hexdigest()
+                    block_list.append(block_md5)
+
+        if len(block_list) < 2:
+            dirname, filename = posixpath.split(remote_path)
+            with open(local_path, 'rb') as f:
+                return self.upload(dirname, f, filename, ondup=ondup,
+                                   callback=callback, **kwargs)
+
+        ret = self.check_file_blocks(remote_path, size, block_list, **kwargs)
+        foo = decode_json(ret)
+        if foo.get('errno', 0) != 0:
+            raise PCSError('check_file_blocks failed: %s' % ret.content, ret)
+        missing = foo.get('block_list', block_list)
+        # 新版接口返回的是块序号
+        if missing and isinstance(missing[0], int):
+            missing = [block_list[i] for i in missing]
+        missing = set(missing)
+
+        # 以服务器返回的缺少的块为准：日志中记录已上传、但服务器上已经过期的块重新上传
+        if journal:
+            journal.discard([idx for idx, block_md5 in enumerate(block_list)
+                             if block_md5 in missing and journal.get(idx) is not None])
+
+        # 相同内容的块只需上传一次
+        indexes = []
+        for idx, block_md5 in enumerate(block_list):
+            if block_md5 in missing:
+                indexes.append(idx)
+                missing.discard(block_md5)
+
+        total = sum(min(block_size, size - idx * block_size) for idx in indexes)
+        progress = {}
+        lock = threading.Lock()
+
+        def _upload_block(idx):
+            def _callback(**kwargs):
+                with lock:
+                    progress[idx] = kwargs['progress']
+                    done = min(sum(progress.values()), total)
+                callback(size=total, progress=done)
+
+            with open(local_path, 'rb') as f:
+                f.seek(idx * block_size)
+                block = StringIO(f.read(block_size))
+            ret = self.upload_tmpfile(block, callback=callback and _callback,
+                                      **kwargs)
+            return idx, ret
+
+        logging.debug('upload %s: %d of %d blocks missing' % (
+            local_path, len(indexes), len(block_list)))
+        pool = ThreadPool(workers)
+        try:
+            for idx, ret in pool.imap_unordered(_upload_block, indexes):
+                try:
+                    block_md5 = decode_json(ret).get('md5')
+                except ValueError:
+                    block_md5 = None
+                if block_md5 != block_list[idx]:
+                    raise PCSError('upload block %d failed: %s' % (idx, ret.content), ret)
+                if journal:
+                    journal.done(idx, block_md5)
+        finally:
+            pool.terminate()
+
+        ret = self.upload_superfile(remote_path, block_list, ondup=ondup, **kwargs)
+        if journal and ret.ok:
+            journal.remove()
+        return ret
+
+    def put(self, local_path, remote_path, ondup="newcopy", workers=4,
+            callback=None, **kwargs):
+        """上传本地文件，优先尝试秒传.
+
+        只计算一次文件指纹：先调用 ``rapidupload`` ，服务器上没有相同内容时
+        小文件（只有一块）使用 ``upload`` 上传，大文件使用 ``upload_file``
+        分片并发上传。
+
+        :param local_path: 本地文件路径
+        :param remote_path: 网盘中文件的保存路径（包含文件名），必须以 / 开头。
+        :param ondup: （可选）同 ``upload`` ，秒传时同样使用；
+                      为 'overwrite' 或 'newcopy' 以外的值（如 None）时
+                      远程文件已存在则不上传
+        :param workers: 分片上传时的并发线程数，默认为4
+        :param callback: 上传进度回调函数，同 ``upload_file``
+
+        :return: (str, requests.Response) -- 实际使用的上传方式及其返回
+
+            .. note::
+                上传方式有
+
+                * 'rapidupload'：秒传成功
+                * 'exists'：远程文件已存在（秒传返回 errno -8），ondup 不是
+                  'overwrite' 或 'newcopy'，没有上传
+                * 'upload'：小文件（包括秒传返回 errno 2 即不足256kb的文件）直接上传
+                * 'upload_file'：大文件分片上传
+
+            秒传返回其它错误时抛出 PCSError
+        """
+        fingerprint = self.fingerprint(local_path)
+        ret = self.rapidupload(None, remote_path, fingerprint=fingerprint,
+                               ondup=ondup, **kwargs)
+        try:
+            errno = decode_json(ret).get('errno', 0)
+        except ValueError:
+            raise PCSError('rapidupload failed: %s' % ret.content, ret)
+
+        if errno == 0:
+            return 'rapidupload', ret
+        if errno == -8 and ondup not in ("overwrite", "newcopy"):
+            return 'exists', ret
+        # 要求覆盖或另存时秒传仍返回 -8 ，改为普通上传
+        if errno not in (-8, 2, 404):
+            raise PCSError('rapidupload failed: %s' % ret.content, ret)
+
+        logging.debug('rapidupload missed (errno %d): %s' % (errno, local_path))
+        if errno == 2 or len(fingerprint.block_list) < 2:
+            dirname, filename = posixpath.split(remote_path)
+            with open(local_path, 'rb') as f:
+                return 'upload', self.upload(dirname, f, filename, ondup=ondup,
+                                             callback=callback, **kwargs)
+        return 'upload_file', self.upload_file(local_path, remote_path, workers=workers,
+                                               ondup=ondup, callback=callback,
+                                               fingerprint=fingerprint, **kwargs)
+
+    def download(self, remote_path, host=None, **kwargs):
         """下载单个文件。
 
         download 接口支持HTTP协议标准range定义，通过指定range的取值可以实现
@@ -504,16 +1269,242 @@ class PCS(BaseClass):
                                 * 文件名或路径名开头结尾不能是 ``.``
                                   或空白字符，空白字符包括：
                                   ``\\r, \\n, \\t, 空格, \\0, \\x0B`` 。
+        :param host: （可选）使用的 pcs 服务器，缺省为当前选择的服务器
         :return: requests.Response 对象
         """
 
         params = {
             'path': remote_path,
         }
-        url = 'https://{0}/rest/2.0/pcs/file'.format(BAIDUPCS_SERVER)
+        url = 'https://{0}/rest/2.0/pcs/file'.format(host or self._pcs_host())
         return self._request('file', 'download', url=url,
                              extra_params=params, **kwargs)
 
+    def download_file(self, remote_path, local_path, connections=4,
+                      part_size=PART_SIZE, resume=False, state_dir=None, hosts=None,
+                      **kwargs):
+        """多连接分段下载文件.
+
+        通过 ``meta`` 获得文件大小并预先分配本地文件，将文件分成 part_size
+        大小的区间，用 connections 个连接并发发起 Range 请求，
+        每个区间直接写入本地文件的对应位置，不在内存中缓存整个文件。
+
+        :param remote_path: 网盘中文件的路径（包含文件名），必须以 / 开头。
+        :param local_path: 本地保存路径
+        :param connections: 并发连接数，默认为4
+        :param part_size: 每个 Range 请求的字节数，默认为8M
+        :param resume: 是否支持断点续传，默认为 False
+
+            .. note::
+                在目标文件旁的 ``.文件名.pcsdownload`` 中用位图记录已完成的区间，
+                中断后以相同参数再次调用只请求缺少的区间。
+                远程文件的 md5 或 server_mtime 改变时从头下载。
+        :param state_dir: 日志的保存目录，缺省保存在目标文件所在目录
+        :param hosts: （可选）同时使用的 pcs 服务器数，或服务器列表
+
+            .. note::
+                指定时将区间分散到 ``host_selector`` 中最快的几个服务器上下载，
+                连接数按各服务器的吞吐量分配。所有连接从同一个队列中取区间，
+                出错的区间交给其它服务器重试，明显慢于最快服务器的服务器
+                不再领取新的区间。
+
+        :return: dict -- 远程文件的 meta 信息（同 ``meta`` 返回的 info 中的一项）
+
+        .. note::
+            meta 或某个区间下载失败时抛出 PCSError
+        """
+        ret = self.meta([remote_path])
+        foo = decode_json(ret)
+        if foo.get('errno', 0) != 0 or not foo.get('info'):
+            raise PCSError('meta failed: %s' % ret.content, ret)
+        info = foo['info'][0]
+        size = info['size']
+
+        journal = None
+        if resume:
+            journal = DownloadJournal(local_path, remote_path, info, part_size, state_dir)
+            if journal.resumed and (not os.path.exists(local_path) or
+                                    os.path.getsize(local_path) != size):
+                journal.reset()
+
+        if not (journal and journal.resumed):
+            # 截断后的文件是稀疏文件，未下载的部分不占用磁盘
+            with open(local_path, 'wb') as f:
+                f.truncate(size)
+
+        ranges = [(idx, start, min(start + part_size, size) - 1)
+                  for idx, start in enumerate(xrange(0, size, part_size))
+                  if not (journal and journal.is_done(idx))]
+        self._download_ranges(remote_path, local_path, ranges, connections, hosts,
+                              journal, **kwargs)
+
+        if journal:
+            journal.remove()
+        return info
+
+    def _download_ranges(self, remote_path, local_path, ranges, connections=4,
+                         hosts=None, journal=None, **kwargs):
+        """并发下载远程文件的若干区间，写入已存在的本地文件的对应位置
+
+        :param ranges: [(序号, 起始字节, 结束字节)]，序号用于记录到 journal
+        """
+        headers = kwargs.pop('headers', None) or {}
+
+        def _fetch(rng, host):
+            idx, start, end = rng
+            foo = dict(headers)
+            foo['Range'] = 'bytes=%d-%d' % (start, end)
+            begin = time.time()
+            ret = self.download(remote_path, host=host, headers=foo, stream=True,
+                                _hold_slot=True, **kwargs)
+            # 统计记在分配给这个连接的服务器上（重定向后 ret.url 是另一个服务器），
+            # _stripe_slow 和 _stripe_connections 读取的是它
+            host = host or self.pcs_server
+            try:
+                if ret.status_code != 206 and not (ret.status_code == 200 and start == 0):
+                    raise PCSError('download range %d-%d failed: HTTP %d' % (
+                        start, end, ret.status_code), ret)
+                written = 0
+                with open(local_path, 'r+b') as f:
+                    f.seek(start)
+                    for chunk in ret.iter_content(CHUNK_SIZE):
+                        # 服务器忽略 Range 时只取需要的部分
+                        chunk = chunk[:end - start + 1 - written]
+                        f.write(chunk)
+                        written += len(chunk)
+                        if written > end - start:
+                            break
+            except requests.RequestException:
+                self._report_pcs(host, ok=False)
+                raise
+            finally:
+                ret.close()
+            if written != end - start + 1:
+                self._report_pcs(host, ok=False)
+                raise PCSError('download range %d-%d truncated at %d' % (
+                    start, end, written), ret)
+            self._report_pcs(host, throughput=written / max(time.time() - begin, 1e-3))
+            if journal:
+                journal.done(idx)
+
+        hosts = self._stripe_hosts(hosts)
+        cond = threading.Condition()
+        # 待下载的区间，每项为 (区间, 已经失败的服务器, 最后一次的错误)
+        pending = collections.deque((rng, set(), None) for rng in ranges)
+        inflight = [0]
+        errors = []
+
+        def _take(host):
+            with cond:
+                while not errors:
+                    for i, item in enumerate(pending):
+                        if host not in item[1]:
+                            del pending[i]
+                            inflight[0] += 1
+                            return item
+                    if not inflight[0]:
+                        return None
+                    # 进行中的区间失败后可能交给本服务器，等待其完成
+                    cond.wait()
+
+        def _finish(item=None, error=None):
+            with cond:
+                inflight[0] -= 1
+                if item is not None:
+                    pending.append(item)
+                if error is not None:
+                    errors.append(error)
+                cond.notify_all()
+
+        def _worker(host):
+            while True:
+                item = _take(host)
+                if item is None:
+                    return
+                rng, failed, _ = item
+                try:
+                    _fetch(rng, host)
+                except (PCSError, requests.RequestException) as e:
+                    failed.add(host)
+                    if len(failed) >= len(hosts):
+                        _finish(error=e)
+                        return
+                    # 交给还没有失败过的服务器重试
+                    logging.debug('range %d-%d failed on %s: %s' % (rng[1], rng[2], host, e))
+                    _finish((rng, failed, e))
+                    if not self.host_selector.available(host):
+                        return
+                    continue
+                except Exception as e:
+                    _finish(error=e)
+                    return
+                _finish()
+                if len(hosts) > 1 and self._stripe_slow(host, hosts):
+                    logging.debug('%s is too slow, leave remaining ranges to others' % host)
+                    return
+
+        threads = []
+        for host, count in self._stripe_connections(hosts, connections):
+            for _ in xrange(count):
+                thread = threading.Thread(target=_worker, args=(host,))
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        if pending:
+            # 剩下的区间在仍有连接的服务器上都已失败过
+            raise pending[0][2] or PCSError('no pcs server available for %s' % remote_path)
+
+    def _stripe_hosts(self, hosts):
+        """返回分段下载使用的服务器列表，[None] 表示只使用当前服务器
+        """
+        if not hosts:
+            return [None]
+        if not isinstance(hosts, int):
+            return list(hosts)
+        if len(self.host_selector.ranking()) < hosts:
+            self.get_fastest_pcs_server_test()
+        return self.host_selector.best(hosts) or [None]
+
+    def _stripe_connections(self, hosts, connections):
+        """按吞吐量把连接数分配给各服务器，每个服务器至少一个连接，总数为 connections
+
+        连接数少于服务器数时只使用前 connections 个（最快的）服务器。
+        """
+        hosts = hosts[:max(1, connections)]
+        if len(hosts) == 1:
+            return [(hosts[0], connections)]
+        weights = []
+        for host in hosts:
+            stats = self.host_selector.stats(host)
+            weights.append(stats.throughput)
+        known = [w for w in weights if w]
+        default = sum(known) / len(known) if known else 1.0
+        weights = [w or default for w in weights]
+        total = sum(weights)
+        spare = connections - len(hosts)
+        shares = [spare * w / total for w in weights]
+        counts = [1 + int(share) for share in shares]
+        # 余下的连接按小数部分从大到小分配
+        left = connections - sum(counts)
+        for i in sorted(xrange(len(hosts)), key=lambda i: int(shares[i]) - shares[i])[:left]:
+            counts[i] += 1
+        return zip(hosts, counts)
+
+    def _stripe_slow(self, host, hosts):
+        """服务器不可用，或吞吐量低于最快服务器的 1/switch_ratio
+        """
+        selector = self.host_selector
+        if not selector.available(host):
+            return True
+        throughput = selector.stats(host).throughput
+        best = max(selector.stats(h).throughput for h in hosts)
+        return bool(throughput and best and throughput * selector.switch_ratio < best)
+
+    @typed_result(FileResult)
     def mkdir(self, remote_path, **kwargs):
         """为当前用户创建一个目录.
 
@@ -541,8 +1532,11 @@ class PCS(BaseClass):
             "block_list": "[]"
         }
         # 奇怪的是创建新目录的method是post
-        return self._request('create', 'post', data=data, **kwargs)
+        ret = self._request('create', 'post', data=data, **kwargs)
+        self._invalidate([remote_path])
+        return ret
 
+    @typed_result(FileList)
     def list_files(self, remote_path, by="name", order="desc",
                    limit=None, **kwargs):
         """获取目录下的文件列表.
@@ -594,6 +1588,448 @@ class PCS(BaseClass):
         }
         return self._request('list', 'list', extra_params=params, **kwargs)
 
+    def iter_files(self, remote_path, by="name", order="desc", page_size=1000,
+                   prefetch=True, **kwargs):
+        """逐条返回目录下的文件，自动分页.
+
+        每次请求一页，返回当前页时在后台获取下一页，内存中最多保存两页。
+
+        :param remote_path: 网盘中目录的路径，必须以 / 开头。
+        :param by: 排序字段，同 ``list_files``
+        :param order: “asc”或“desc”，同 ``list_files``
+        :param page_size: 每页的条目数，默认为1000
+        :param prefetch: 是否预先获取下一页，默认为 True
+        :return: generator -- 每项为 ``list_files`` 返回的 list 中的一项
+
+        .. note::
+            请求出错时抛出 PCSError
+        """
+        params = {
+            'dir': remote_path,
+            'order': by,
+            'desc': "1" if order == "desc" else "0",
+            'num': page_size,
+        }
+
+        def _fetch(page):
+            foo = dict(params, page=page + 1)
+            return self._request('list', 'list', extra_params=foo, **kwargs)
+        return self._iter_pages(_fetch, 'list', page_size, prefetch)
+
+    def walk(self, root, workers=8, max_depth=None, ordered=False, onerror=None,
+             **kwargs):
+        """遍历网盘中的目录树，类似 ``os.walk``.
+
+        按广度优先的顺序并发获取各目录的文件列表，同时进行的请求不超过 workers 个。
+
+        >>> for dirpath, dirs, files in pcs.walk('/backup', workers=16):
+        ...     print dirpath, len(files)
+
+        :param root: 起始目录，必须以 / 开头
+        :param workers: 同时获取的目录数，默认为8
+        :param max_depth: 最多向下遍历的层数，root 为第0层，缺省为不限
+        :param ordered: 为 True 时严格按广度优先的顺序返回各目录，
+                        否则按获取完成的先后返回（更快）
+        :param onerror: 获取某个目录出错时以异常（PCSError、连接错误等）为参数调用，
+                        缺省时与 ``os.walk`` 一样忽略返回错误码的目录，
+                        其它异常（如重试后仍然连接失败）直接抛出
+        :param kwargs: 其它参数（by, order, page_size）同 ``iter_files``
+        :return: generator -- 每项为 (dirpath, dirs, files)，
+                 dirs 和 files 为 ``list_files`` 返回的 list 中的项
+
+        .. note::
+            与 ``os.walk`` 一样，可以在循环中修改 dirs （如删除某些项）
+            来跳过不需要遍历的子目录。
+
+        .. note::
+            不会修改连接池的设置。workers 大于 pan 连接池（默认为10）时，
+            自适应并发限制（见 ``AdaptiveLimiter``）把同时进行的请求数限制在
+            连接池大小以内；不使用自适应限制时，应先用
+            ``configure_pools(pan=workers)`` 增大连接池。
+        """
+        def _list(path, depth):
+            # 线程中的异常不会调用 callback ，必须作为结果返回，否则主线程会一直等待
+            try:
+                entries = list(self.iter_files(path, prefetch=False, **kwargs))
+            except Exception as e:
+                return path, depth, None, e
+            return path, depth, entries, None
+
+        pool = ThreadPool(workers)
+        done = Queue.Queue()
+        pending = collections.deque([(root, 0)])
+        inflight = collections.deque()
+        running = 0
+        try:
+            while pending or running:
+                while pending and running < workers:
+                    path, depth = pending.popleft()
+                    if ordered:
+                        inflight.append(pool.apply_async(_list, (path, depth)))
+                    else:
+                        pool.apply_async(_list, (path, depth), callback=done.put)
+                    running += 1
+                if ordered:
+                    path, depth, entries, error = inflight.popleft().get()
+                else:
+                    path, depth, entries, error = done.get()
+                running -= 1
+                if error is not None:
+                    logging.debug('walk %s failed: %s' % (path, error))
+                    if onerror is not None:
+                        onerror(error)
+                    elif not isinstance(error, PCSError):
+                        raise error
+                    continue
+                dirs = [entry for entry in entries if entry.get('isdir')]
+                files = [entry for entry in entries if not entry.get('isdir')]
+                yield path, dirs, files
+                if max_depth is None or depth < max_depth:
+                    pending.extend((entry['path'], depth + 1) for entry in dirs)
+        finally:
+            pool.terminate()
+
+    def scan(self, root, workers=8, max_depth=None, **kwargs):
+        """遍历目录树，把所有文件和目录保存在紧凑的 FileTable 中.
+
+        适用于整个网盘有数百万个文件的情况，每一项只占用几十字节。
+
+        :param root: 起始目录，必须以 / 开头
+        :param workers: 同时获取的目录数，默认为8
+        :param max_depth: 最多向下遍历的层数，同 ``walk``
+        :param kwargs: 其它参数同 ``walk``
+        :return: FileTable -- 不包括 root 本身
+        """
+        table = FileTable()
+        for dirpath, dirs, files in self.walk(root, workers, max_depth, **kwargs):
+            table.extend(dirs)
+            table.extend(files)
+        return table
+
+    def stat(self, remote_path, **kwargs):
+        """获取单个文件或目录的信息，设置了 meta_cache 时优先使用缓存.
+
+        :param remote_path: 网盘中文件或目录的路径
+        :return: dict -- 同 ``meta`` 返回的 info 中的一项
+
+        .. note::
+            文件不存在或请求出错时抛出 PCSError
+        """
+        cache = self.meta_cache
+        if cache is not None:
+            info = cache.get(remote_path)
+            if info is not None:
+                return info
+        ret = self.meta([remote_path], **kwargs)
+        info = self._load_json(ret, 'stat %s' % remote_path)['info'][0]
+        if cache is not None:
+            cache.put(info)
+        return info
+
+    def listdir(self, remote_path, **kwargs):
+        """获取目录下的全部文件，设置了 meta_cache 时优先使用缓存.
+
+        :param remote_path: 网盘中目录的路径
+        :return: list -- 每项同 ``list_files`` 返回的 list 中的一项，按文件名排序
+
+        .. note::
+            请求出错时抛出 PCSError
+        """
+        cache = self.meta_cache
+        if cache is not None:
+            entries = cache.get_listing(remote_path)
+            if entries is not None:
+                return entries
+        entries = list(self.iter_files(remote_path, order="asc", prefetch=False,
+                                       **kwargs))
+        if cache is not None:
+            cache.put_listing(remote_path, entries)
+        return entries
+
+    def sync_up(self, local_dir, remote_dir, workers=4, dry_run=False, delete=False,
+                checksum=False, **kwargs):
+        """把本地目录增量同步到网盘.
+
+        比较本地目录和网盘目录（大小、修改时间、md5），只执行必要的操作：
+
+        * 远程不存在或内容不同的文件用 ``put`` 上传（优先秒传，大文件分片上传），
+          覆盖远程文件；
+        * 远程多出的文件与新增的本地文件内容和文件名相同时用 ``move`` 移动；
+        * 为空目录调用 ``mkdir`` （上传文件时会自动创建所在目录）；
+        * delete 为 True 时删除远程多出的文件和目录。
+
+        mkdir 和 put 由 workers 个线程并发执行，move 和 delete 通过 ``batch``
+        批量执行。删除在所有上传完成后进行。
+
+        :param local_dir: 本地目录
+        :param remote_dir: 网盘目录，不存在时自动创建
+        :param workers: 同时进行的操作数，默认为4
+        :param dry_run: 为 True 时只返回计划，不执行
+        :param delete: 是否删除本地没有的远程文件，默认为 False
+        :param checksum: 为 True 时比较所有大小相同的文件的 md5，
+                         否则上传后没有修改过（本地修改时间早于远程文件的
+                         server_mtime）的文件视为相同
+
+        :return: list -- 按执行顺序排列的操作，每项为以下之一
+
+            * ('mkdir', 远程路径)
+            * ('move', 远程原路径, 远程新路径)
+            * ('put', 本地路径, 远程路径)
+            * ('delete', 远程路径)
+
+        .. note::
+            某个操作失败时抛出 PCSError ，之后的操作（包括删除）不再执行。
+        """
+        local_dir = os.path.abspath(local_dir)
+        remote_dir = remote_dir.rstrip('/') or '/'
+
+        def _onerror(error):
+            raise error
+
+        def _walk(path):
+            return self.walk(path, workers=workers, onerror=_onerror)
+
+        def _fingerprint(rel):
+            return self.fingerprint(os.path.join(local_dir, *rel.split('/')))
+
+        local = scan_local(local_dir)
+        try:
+            if remote_dir != '/':
+                self.stat(remote_dir)
+        except PCSError:
+            remote = ({}, {})
+        else:
+            remote = scan_remote(_walk, remote_dir)
+
+        plan = []
+        for op in plan_up(local, remote, _fingerprint, delete, checksum):
+            if op[0] == 'put':
+                plan.append(('put', os.path.join(local_dir, *op[1].split('/')),
+                             posixpath.join(remote_dir, op[1])))
+            else:
+                plan.append((op[0],) + tuple(posixpath.join(remote_dir, rel)
+                                             for rel in op[1:]))
+        if not plan and not remote[0] and not remote[1] and remote_dir != '/':
+            plan.append(('mkdir', remote_dir))
+        logging.debug('sync %s -> %s: %d operations' % (local_dir, remote_dir, len(plan)))
+        if not dry_run:
+            self._run_plan(plan, workers, **kwargs)
+        return plan
+
+    def sync_down(self, remote_dir, local_dir, workers=4, connections=4, dry_run=False,
+                  delete=False, checksum=False, **kwargs):
+        """把网盘目录增量同步到本地.
+
+        比较网盘目录和本地目录（大小、修改时间、md5），只下载改变了的文件：
+
+        * 本地不存在的文件用 ``download_file`` 下载；
+        * 本地已存在但内容不同的文件，按 ``meta`` 返回的 block_list
+          逐块比较，只下载 md5 不同的块，其余块从本地旧文件复制；
+        * delete 为 True 时删除远程没有的本地文件和目录。
+
+        下载到临时文件后再替换目标文件，完成后将本地文件的修改时间设为
+        远程文件的 server_mtime ，下次同步时修改时间相同的文件不需要计算 md5。
+
+        :param remote_dir: 网盘目录
+        :param local_dir: 本地目录，不存在时自动创建
+        :param workers: 同时下载的文件数，默认为4
+        :param connections: 每个文件的并发连接数，默认为4
+        :param dry_run: 为 True 时只返回计划，不执行
+        :param delete: 是否删除远程没有的本地文件，默认为 False
+        :param checksum: 为 True 时比较所有大小相同的文件的 md5，
+                         否则修改时间等于远程 server_mtime 的文件视为相同
+
+        :return: list -- 按执行顺序排列的操作，每项为以下之一
+
+            * ('mkdir', 本地路径)
+            * ('download', 远程路径, 本地路径)
+            * ('patch', 远程路径, 本地路径) -- 只下载改变了的块
+            * ('delete', 本地路径)
+
+        .. note::
+            按块比较需要远程文件是以默认块大小（见 ``Fingerprint`` ）分片上传的，
+            否则下载整个文件。某个操作失败时抛出 PCSError ，之后的操作不再执行。
+        """
+        local_dir = os.path.abspath(local_dir)
+        remote_dir = remote_dir.rstrip('/') or '/'
+
+        def _onerror(error):
+            raise error
+
+        def _walk(path):
+            return self.walk(path, workers=workers, onerror=_onerror)
+
+        def _local(rel):
+            return os.path.join(local_dir, *rel.split('/'))
+
+        def _fingerprint(rel):
+            return self.fingerprint(_local(rel))
+
+        remote = scan_remote(_walk, remote_dir)
+        local = scan_local(local_dir)
+        plan = []
+        for op in plan_down(remote, local, _fingerprint, delete, checksum):
+            if op[0] in ('download', 'patch'):
+                plan.append((op[0], posixpath.join(remote_dir, op[1]), _local(op[1])))
+            else:
+                plan.append((op[0], _local(op[1])))
+        logging.debug('sync %s -> %s: %d operations' % (remote_dir, local_dir, len(plan)))
+        if dry_run:
+            return plan
+
+        def _run(op):
+            self._sync_file(op[1], op[2], op[0] == 'patch', connections, **kwargs)
+
+        def _kind(op):
+            return 'transfer' if op[0] in ('download', 'patch') else op[0]
+
+        if not os.path.isdir(local_dir):
+            os.makedirs(local_dir)
+        for kind, ops in itertools.groupby(plan, key=_kind):
+            ops = list(ops)
+            if kind == 'transfer':
+                pool = ThreadPool(workers)
+                try:
+                    for _ in pool.imap_unordered(_run, ops):
+                        pass
+                finally:
+                    pool.terminate()
+                continue
+            for op in ops:
+                if kind == 'mkdir':
+                    if not os.path.isdir(op[1]):
+                        os.makedirs(op[1])
+                elif os.path.isdir(op[1]):
+                    shutil.rmtree(op[1])
+                else:
+                    os.remove(op[1])
+        return plan
+
+    def _sync_file(self, remote_path, local_path, patch=False, connections=4, **kwargs):
+        """下载一个文件到临时文件后替换 local_path ，patch 为 True 时复用本地文件中相同的块
+        """
+        dirname, basename = os.path.split(local_path)
+        tmp = os.path.join(dirname, '.%s.pcssync' % basename)
+        info = None
+        if patch:
+            ret = self.meta([remote_path])
+            info = self._load_json(ret, 'meta %s' % remote_path)['info'][0]
+            size = info['size']
+            block_list = info.get('block_list') or []
+            block_size = block_size_for(size)
+            if len(block_list) < 2 or len(block_list) != (size + block_size - 1) // block_size:
+                info = None
+        if info is None:
+            info = self.download_file(remote_path, tmp, connections=connections, **kwargs)
+        else:
+            old = self.fingerprint(local_path, block_size=block_size).block_list
+            ranges = [(idx, idx * block_size, min((idx + 1) * block_size, size) - 1)
+                      for idx, block_md5 in enumerate(block_list)
+                      if idx >= len(old) or old[idx] != block_md5]
+            logging.debug('patch %s: %d of %d blocks changed' % (
+                local_path, len(ranges), len(block_list)))
+            shutil.copyfile(local_path, tmp)
+            with open(tmp, 'r+b') as f:
+                f.truncate(size)
+            self._download_ranges(remote_path, tmp, ranges, connections, **kwargs)
+            if Fingerprint.from_file(tmp, block_size).block_list != block_list:
+                os.remove(tmp)
+                raise PCSError('patch %s failed: block md5 mismatch' % local_path)
+        if os.name == 'nt' and os.path.exists(local_path):
+            os.remove(local_path)
+        os.rename(tmp, local_path)
+        os.utime(local_path, (time.time(), info['server_mtime']))
+        return info
+
+    def _run_plan(self, plan, workers, **kwargs):
+        """执行 sync_up 计划的操作，连续的同类操作一起执行
+        """
+        def _check(ret, action):
+            self._load_json(ret, action)
+
+        def _run(op):
+            if op[0] == 'mkdir':
+                _check(self.mkdir(op[1], **kwargs), 'mkdir %s' % op[1])
+            else:
+                how, ret = self.put(op[1], op[2], ondup="overwrite", **kwargs)
+                _check(ret, 'put %s' % op[2])
+
+        for kind, ops in itertools.groupby(plan, key=lambda op: op[0]):
+            ops = list(ops)
+            if kind in ('move', 'delete'):
+                batch = self.batch(workers=workers)
+                for op in ops:
+                    if kind == 'move':
+                        batch.move([op[1]], posixpath.dirname(op[2]))
+                    else:
+                        batch.delete([op[1]])
+                for result in batch.run():
+                    if result['errno']:
+                        raise PCSError('%s %s failed: errno %s' % (
+                            kind, result['path'], result['errno']))
+                # 之后的 mkdir、put 可能使用刚删除或移走的路径
+                batch.wait_visible()
+            else:
+                pool = ThreadPool(workers)
+                try:
+                    for _ in pool.imap_unordered(_run, ops):
+                        pass
+                finally:
+                    pool.terminate()
+
+    def iter_category(self, file_type, page_size=1000, prefetch=True, **kwargs):
+        """逐条返回某一类型的文件，自动分页.
+
+        :param file_type: 类型，同 ``list_streams``
+        :param page_size: 每页的条目数，默认为1000
+        :param prefetch: 是否预先获取下一页，默认为 True
+        :param kwargs: 其它参数（order, desc, filter_path）同 ``list_streams``
+        :return: generator -- 每项结构同 ``list_files`` 返回的 list 中的一项
+        """
+        def _fetch(page):
+            return self.list_streams(file_type, start=page * page_size,
+                                     limit=page_size, **kwargs)
+        return self._iter_pages(_fetch, 'info', page_size, prefetch)
+
+    def iter_recycle(self, page_size=1000, prefetch=True, **kwargs):
+        """逐条返回回收站中的文件及目录，自动分页.
+
+        :param page_size: 每页的条目数，默认为1000
+        :param prefetch: 是否预先获取下一页，默认为 True
+        :param kwargs: 其它参数（order, desc）同 ``list_recycle_bin``
+        :return: generator
+        """
+        def _fetch(page):
+            return self.list_recycle_bin(start=page * page_size, limit=page_size,
+                                         **kwargs)
+        return self._iter_pages(_fetch, 'list', page_size, prefetch)
+
+    def iter_tasks(self, page_size=1000, prefetch=True, **kwargs):
+        """逐条返回离线下载任务，自动分页.
+
+        :param page_size: 每页的条目数，默认为1000
+        :param prefetch: 是否预先获取下一页，默认为 True
+        :param kwargs: 其它参数（status, asc 等）同 ``list_download_tasks``
+        :return: generator -- 每项为 ``list_download_tasks`` 返回的 task_info 中的一项
+        """
+        def _fetch(page):
+            return self.list_download_tasks(start=page * page_size, limit=page_size,
+                                            **kwargs)
+        return self._iter_pages(_fetch, 'task_info', page_size, prefetch)
+
+    def iter_search(self, path, keyword, page_size=1000, prefetch=True, **kwargs):
+        """逐条返回搜索结果，自动分页.
+
+        :param path: 搜索目录
+        :param keyword: 关键词
+        :param page_size: 每页的条目数，默认为1000
+        :param prefetch: 是否预先获取下一页，默认为 True
+        :return: generator -- 每项结构同 ``list_files`` 返回的 list 中的一项
+        """
+        def _fetch(page):
+            return self.search(path, keyword, page=page + 1, limit=page_size, **kwargs)
+        return self._iter_pages(_fetch, 'list', page_size, prefetch)
+
 
     def move(self, path_list, dest, **kwargs):
         """
@@ -605,45 +2041,29 @@ class PCS(BaseClass):
         :param dest: 要移动到的目录
         :type dest: str
 
+        .. note::
+            大量文件请使用 ``batch`` 分批并发执行
+
         """
-        def __path(path):
-            if path.endswith('/'):
-                return path.split('/')[-2]
-            else:
-                return os.path.basename(path)
-        params = {
-            'opera':'move'
-        }
-        data = {
-            'filelist': json.dumps([{
-                        "path":path,
-                        "dest":dest,
-                        "newname":__path(path)} for path in path_list]),
-        }
-        url = 'http://{0}/api/filemanager'.format(BAIDUPAN_SERVER)
-        return self._request('filemanager', 'move', url=url, data=data, extra_params=params, **kwargs)
+        return self._filemanager('move', [{
+            "path": path,
+            "dest": dest,
+            "newname": posixpath.basename(path.rstrip('/'))} for path in path_list],
+            **kwargs)
+
     def rename(self, rename_pair_list, **kwargs):
         """重命名
 
         :param rename_pair_list: 需要重命名的文件(夹)pair （路径，新名称）列表,如[('/aa.txt','bb.txt')]
         :type rename_pair_list: list
 
-        """
-        foo = []
-        for path,newname in rename_pair_list:
-            foo.append({'path':path,
-                        'newname':newname
-            })
-
-        data = {'filelist':json.dumps(foo)}
-        params = {
-            'opera':'rename'
-        }
+        .. note::
+            大量文件请使用 ``batch`` 分批并发执行
 
-        url = 'http://{0}/api/filemanager'.format(BAIDUPAN_SERVER)
-        print '请求url',url
-        logging.debug('rename '+str(data)+'URL:'+url)
-        return self._request('filemanager', 'rename', url=url, data=data, extra_params=params, **kwargs)
+        """
+        return self._filemanager('rename', [{
+            'path': path,
+            'newname': newname} for path, newname in rename_pair_list], **kwargs)
 
     def copy(self, path_list, dest, **kwargs):
         """
@@ -655,23 +2075,15 @@ class PCS(BaseClass):
         :param dest: 要复制到的目录
         :type dest: str
 
+        .. note::
+            大量文件请使用 ``batch`` 分批并发执行
+
         """
-        def __path(path):
-            if path.endswith('/'):
-                return path.split('/')[-2]
-            else:
-                return os.path.basename(path)
-        params = {
-            'opera':'copy'
-        }
-        data = {
-            'filelist': json.dumps([{
-                        "path":path,
-                        "dest":dest,
-                        "newname":__path(path)} for path in path_list]),
-        }
-        url = 'http://{0}/api/filemanager'.format(BAIDUPAN_SERVER)
-        return self._request('filemanager', 'move', url=url, data=data, extra_params=params, **kwargs)
+        return self._filemanager('copy', [{
+            "path": path,
+            "dest": dest,
+            "newname": posixpath.basename(path.rstrip('/'))} for path in path_list],
+            **kwargs)
 
     def delete(self, path_list, **kwargs):
         """
@@ -680,13 +2092,54 @@ class PCS(BaseClass):
         :param path_list: 待删除的文件或文件夹列表,每一项为服务器路径
         :type path_list: list
 
+        .. note::
+            大量文件请使用 ``batch`` 分批并发执行
+
 
+        """
+        return self._filemanager('delete', list(path_list), **kwargs)
+
+    def _filemanager(self, opera, filelist, **kwargs):
+        """请求 filemanager 接口，并使 meta_cache 中受影响的条目失效
+
+        :param opera: move、copy、rename 或 delete
+        :param filelist: 该操作的 filelist ，delete 时为路径列表，其它为 dict 列表
         """
         data = {
-                'filelist': json.dumps([path for path in path_list])
+            'filelist': json.dumps(filelist)
         }
-        url = 'http://{0}/api/filemanager?opera=delete'.format(BAIDUPAN_SERVER)
-        return self._request('filemanager', 'delete', url=url, data=data, **kwargs)
+        params = {
+            'opera': opera
+        }
+        url = 'http://{0}/api/filemanager'.format(BAIDUPAN_SERVER)
+        logging.debug('%s %s URL: %s' % (opera, data, url))
+        ret = self._request('filemanager', opera, url=url, data=data, extra_params=params,
+                            **kwargs)
+        if opera == 'delete':
+            self._invalidate(filelist, recursive=True)
+            return ret
+        if opera in ('move', 'rename'):
+            self._invalidate([item['path'] for item in filelist], recursive=True)
+        self._invalidate([posixpath.join(item.get('dest') or
+                                         posixpath.dirname(item['path'].rstrip('/')),
+                                         item['newname'])
+                          for item in filelist], recursive=True)
+        return ret
+
+    def batch(self, batch_size=BATCH_SIZE, workers=4, wait=True, timeout=30,
+              ignore_errors=False):
+        """批量执行大量 move、copy、rename、delete 操作.
+
+        >>> with pcs.batch(workers=8) as batch:
+        ...     batch.move(paths, '/archive')
+        ...     batch.delete(['/tmp'])
+        >>> failed = [r for r in batch.results if r['errno']]
+
+        :param batch_size: 每次请求的最多文件数，默认为100
+        :param workers: 同时进行的请求数，默认为4
+        :return: FileManagerBatch -- 参数及用法见 ``FileManagerBatch``
+        """
+        return FileManagerBatch(self, batch_size, workers, wait, timeout, ignore_errors)
 
     def share(self, file_ids, pwd=None, **kwargs):
         """
@@ -736,6 +2189,7 @@ class PCS(BaseClass):
         return self._request('share/set', '', url=url, data=data, **kwargs)
 
 
+    @typed_result(MetaList)
     def list_streams(self, file_type, start=0, limit=1000, order='time', desc='1',
                      filter_path=None, **kwargs):
         """以视频、音频、图片及文档四种类型的视图获取所创建应用程序下的
@@ -835,8 +2289,8 @@ class PCS(BaseClass):
             selected_idx = ','.join(map(str,selected_idx))
 
         # 首先上传种子文件
-        ret = self.upload('/', torrent_handler, basename).content
-        remote_path = json.loads(ret)['path']
+        ret = self.upload('/', torrent_handler, basename)
+        remote_path = decode_json(ret)['path']
         logging.debug('REMOTE PATH:' + remote_path)
 
         #开始下载
@@ -936,10 +2390,10 @@ class PCS(BaseClass):
 
         :return: int
         """
-        ret = self.list_download_tasks().content
-        foo = json.loads(ret)
-        return foo['total']
+        ret = self.list_download_tasks()
+        return decode_json(ret)['total']
 
+    @typed_result(TaskList)
     def list_download_tasks(self, need_task_info="1", asc="0", start=0,create_time=None, limit=1000, status="255",source_url=None,remote_path=None, **kwargs):
         """查询离线下载任务ID列表及任务信息.
 
@@ -1057,6 +2511,7 @@ class PCS(BaseClass):
         return self._request('services/cloud_dl', 'cancle_task',
                              data=data, **kwargs)
 
+    @typed_result(FileList)
     def list_recycle_bin(self, order="time", desc="1", start=0, limit=1000, page=1, **kwargs):
         #Done
         """获取回收站中的文件及目录列表.
@@ -1091,7 +2546,13 @@ class PCS(BaseClass):
             'filelist': json.dumps([fs_id for fs_id in fs_ids])
         }
         url = 'http://{0}/api/recycle/restore'.format(BAIDUPAN_SERVER)
-        return self._request('recycle', 'restore', data=data, **kwargs)
+        ret = self._request('recycle', 'restore', data=data, **kwargs)
+        if self.meta_cache is not None:
+            # 不知道还原到哪个目录，所有目录列表都可能已过时
+            for fs_id in fs_ids:
+                self.meta_cache.invalidate_fs_id(fs_id, recursive=True)
+            self.meta_cache.invalidate_listings()
+        return ret
 
     def clean_recycle_bin(self, **kwargs):
 
@@ -1103,7 +2564,8 @@ class PCS(BaseClass):
         url = 'http://{0}/api/recycle/clear'.format(BAIDUPAN_SERVER)
         return self._request('recycle', 'clear', url=url, **kwargs)
 
-    def rapidupload(self,file_handler,path, **kwargs):
+    @typed_result(FileResult)
+    def rapidupload(self,file_handler,path, fingerprint=None, ondup=None, **kwargs):
         """秒传一个文件
 
         :param file_handler: 文件handler, e.g. open('file','rb')
@@ -1112,6 +2574,13 @@ class PCS(BaseClass):
         :param path: 上传到服务器的路径，包含文件名
         :type path: str
 
+        :param fingerprint: （可选）预先计算好的文件指纹，指定时不再读取
+                            file_handler，file_handler 可以为 None
+        :type fingerprint: Fingerprint
+
+        :param ondup: （可选）同 ``upload`` ，'overwrite' 为覆盖已存在的远程文件，
+                      'newcopy' 为另存一份，缺省时远程文件已存在返回 errno -8
+
         :return: requests.Response
 
             .. note::
@@ -1150,35 +2619,23 @@ class PCS(BaseClass):
 
 
         """
-        file_handler.seek(0,2)
-        _BLOCK_SIZE = 2 ** 20
-        content_length = file_handler.tell()
-        file_handler.seek(0)
-
-        # 校验段为前 256kb
-        first_256bytes = file_handler.read(256 * 1024)
-        slice_md5 = md5(first_256bytes).hexdigest()
-
-        content_crc32 = crc32(first_256bytes).conjugate()
-        content_md5 = md5(first_256bytes)
-
-        while True:
-            block = file_handler.read(_BLOCK_SIZE)
-            if not block:
-                break
-            # 更新crc32和md5校验值
-            content_crc32 = crc32(block, content_crc32).conjugate()
-            content_md5.update(block)
+        if fingerprint is None:
+            fingerprint = self.fingerprint(file_handler)
 
         data = {'path':path,
-                'content-length':content_length,
-                'content-md5':content_md5.hexdigest(),
-                'slice-md5':slice_md5,
-                'content-crc32':'%d' % (content_crc32.conjugate() & 0xFFFFFFFF)}
+                'content-length':fingerprint.size,
+                'content-md5':fingerprint.content_md5,
+                'slice-md5':fingerprint.slice_md5,
+                'content-crc32':'%d' % fingerprint.content_crc32}
+        if ondup:
+            data['ondup'] = ondup
         logging.debug('RAPIDUPLOAD DATA ' + str(data))
         #url = 'http://pan.baidu.com/api/rapidupload'
-        return self._request('rapidupload','rapidupload',data=data, **kwargs)
+        ret = self._request('rapidupload','rapidupload',data=data, **kwargs)
+        self._invalidate([path])
+        return ret
 
+    @typed_result(FileList)
     def search(self, path, keyword, page=1, recursion=1, limit=1000, **kwargs):
         """搜索文件
 
@@ -1220,9 +2677,10 @@ class PCS(BaseClass):
                   'width':width,
                   'height':height}
 
-        url = 'http://{0}/rest/2.0/pcs/thumbnail'.format(BAIDUPCS_SERVER)
+        url = 'http://{0}/rest/2.0/pcs/thumbnail'.format(self._pcs_host())
         return self._request('thumbnail','generate', url=url, extra_params=params, **kwargs)
 
+    @typed_result(MetaList)
     def meta(self,file_list, **kwargs):
         """获得文件(s)的metainfo
 
@@ -1292,6 +2750,53 @@ class PCS(BaseClass):
 
         return self._request('filemetas?blocks=1','filemetas',data=data, **kwargs)
 
+    def meta_batch(self, file_list, batch_size=META_BATCH_SIZE, workers=4, **kwargs):
+        """获得大量文件的metainfo
+
+        把 file_list 分成每批最多 batch_size 个路径，用 workers 个线程
+        并发调用 ``meta`` ，按 file_list 的顺序合并结果。
+
+        :param file_list: 文件路径列表
+        :type file_list: list
+        :param batch_size: 每次请求的最多路径数，默认为100
+        :param workers: 同时进行的请求数，默认为4
+
+        :return: list -- 与 file_list 一一对应，每项同 ``meta`` 返回的 info 中的一项。
+                 文件不存在等错误时该项为 {"errno": 错误码, "path": 路径}
+
+        .. note::
+            某一批请求失败时抛出 PCSError 。设置了 meta_cache 时同时缓存得到的信息。
+        """
+        batches = [file_list[i:i + batch_size]
+                   for i in xrange(0, len(file_list), batch_size)]
+
+        def _meta(batch):
+            ret = self.meta(batch, **kwargs)
+            try:
+                info = decode_json(ret).get('info')
+            except ValueError:
+                info = None
+            # 部分文件出错时 errno 不为0，但 info 中仍有每个文件的结果
+            if not isinstance(info, list) or len(info) != len(batch):
+                raise PCSError('meta failed: %s' % ret.content, ret)
+            return info
+
+        pool = ThreadPool(workers)
+        try:
+            results = pool.map(_meta, batches)
+        finally:
+            pool.terminate()
+
+        infos = []
+        for batch, info in zip(batches, results):
+            for path, item in zip(batch, info):
+                if item.get('errno', 0) != 0:
+                    item = dict(item, path=path)
+                elif self.meta_cache is not None:
+                    self.meta_cache.put(item)
+                infos.append(item)
+        return infos
+
     def check_file_blocks(self,path,size,block_list, **kwargs):
         """文件块检查
 
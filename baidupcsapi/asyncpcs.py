@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from functools import wraps
+from multiprocessing.pool import ThreadPool
+
+from api import PCS
+
+
+class AsyncPCS(object):
+    """在固定大小的线程池中执行 PCS 的方法
+
+    方法与 PCS 相同，调用后立即返回 ``multiprocessing.pool.AsyncResult`` 。
+    每个进行中的请求占用线程池中的一个线程，同时进行的请求数不超过 workers，
+    多出的请求排队等待。所有请求共用 PCS 对象的参数处理、登录检查和连接池。
+
+    .. note::
+        这只是一个有上限的线程池，不是 asyncio 的协程：本库支持 Python 2.7 ，
+        返回的 AsyncResult 不能 ``await`` ，需要用 ``get()`` 等待结果。
+
+    >>> pcs = PCS('username', 'password')
+    >>> apcs = AsyncPCS(pcs, workers=32)
+    >>> results = [apcs.meta([path]) for path in paths]
+    >>> print [r.get().content for r in results]
+
+    :param pcs: 已登录的 PCS 对象
+    :param workers: 线程池大小，即同时进行的请求数，默认为16
+    """
+    methods = (
+        'quota', 'list_files', 'meta', 'meta_batch', 'stat', 'listdir',
+        'search', 'thumbnail',
+        'upload', 'upload_tmpfile', 'upload_superfile', 'rapidupload',
+        'check_file_blocks', 'download',
+        'mkdir', 'move', 'copy', 'rename', 'delete', 'share',
+        'list_streams', 'list_recycle_bin', 'restore_recycle_bin',
+        'clean_recycle_bin',
+        'add_download_task', 'add_local_bt_task', 'get_remote_file_info',
+        'query_download_tasks', 'list_download_tasks', 'cancel_download_task',
+    )
+
+    def __init__(self, pcs, workers=16):
+        self.pcs = pcs
+        self.workers = workers
+        self._pool = ThreadPool(workers)
+        # 连接池不小于线程数，否则会出现 "connection pool is full"
+        pcs.configure_pools(**dict((name, max(size, workers))
+                                   for name, size in pcs.pool_sizes.items()))
+
+    def apply(self, func, *args, **kwargs):
+        """在线程池中执行任意函数，返回 AsyncResult
+        """
+        return self._pool.apply_async(func, args, kwargs)
+
+    def close(self):
+        """等待已提交的请求完成后关闭线程池
+        """
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _async_method(name):
+    method = getattr(PCS, name)
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self._pool.apply_async(getattr(self.pcs, name), args, kwargs)
+    return wrapper
+
+for _name in AsyncPCS.methods:
+    setattr(AsyncPCS, _name, _async_method(_name))
+del _name
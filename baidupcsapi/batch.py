@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import posixpath
+from multiprocessing.pool import ThreadPool
+
+from results import decode_json
+
+# 每次 filemanager 请求包含的最多文件数
+BATCH_SIZE = 100
+
+
+def _with_parents(path):
+    path = path.rstrip('/') or '/'
+    while True:
+        yield path
+        if path == '/':
+            return
+        path = posixpath.dirname(path)
+
+
+class FileManagerBatch(object):
+    """批量执行 move、copy、rename、delete
+
+    操作按加入的顺序分成若干阶段，同一阶段的操作按类型分成每批最多
+    batch_size 个文件，用 workers 个线程并发请求 filemanager 接口。
+    filemanager 不是强一致接口，前一阶段完成后要等到结果可见
+    （目标路径存在、原路径消失）才开始下一阶段。
+
+    加入的操作涉及本阶段已经移动、复制、改名或删除的路径（或其父目录、子路径）时
+    自动开始新的阶段，也可以调用 ``barrier`` 手动分隔。
+    ``run`` 不等待最后一个阶段的结果可见，之后还要操作相同路径时调用
+    ``wait_visible``。
+
+    >>> batch = pcs.batch(batch_size=100, workers=8)
+    >>> batch.move(['/a/1.txt', '/a/2.txt'], '/b')
+    >>> batch.rename([('/b/1.txt', '3.txt')])   # 依赖上面的 move，自动等待
+    >>> for result in batch.run():
+    ...     print result['opera'], result['path'], result['errno']
+
+    :param pcs: PCS 对象
+    :param batch_size: 每次请求的最多文件数，默认为100
+    :param workers: 同时进行的请求数，默认为4
+    :param wait: 是否在阶段之间等待结果可见，默认为 True
+    :param timeout: 等待结果可见的最长时间（秒），默认为30
+    :param ignore_errors: 为 False （默认）时某一阶段有操作失败后不再执行之后的阶段
+    """
+    def __init__(self, pcs, batch_size=BATCH_SIZE, workers=4, wait=True, timeout=30,
+                 ignore_errors=False):
+        self.pcs = pcs
+        self.batch_size = batch_size
+        self.workers = workers
+        self.wait = wait
+        self.timeout = timeout
+        self.ignore_errors = ignore_errors
+        self.results = []
+        self._stages = [[]]
+        self._touched = set()
+        # 本阶段涉及的路径及其所有父目录，用于检查新操作是否涉及其中某个路径的子路径
+        self._touched_parents = set()
+
+    def _add(self, opera, item, path, target=None):
+        paths = [foo.rstrip('/') or '/' for foo in ([path] if target is None
+                                                   else [path, target])]
+        if any(p in self._touched for foo in paths for p in _with_parents(foo)) or \
+                any(foo in self._touched_parents for foo in paths):
+            self.barrier()
+        self._stages[-1].append((opera, item, path, target))
+        for foo in paths:
+            self._touched.add(foo)
+            self._touched_parents.update(_with_parents(foo))
+        return self
+
+    def move(self, path_list, dest):
+        """移动文件或文件夹到 dest 目录，参数同 ``PCS.move``
+        """
+        for path in path_list:
+            name = posixpath.basename(path.rstrip('/'))
+            self._add('move', {'path': path, 'dest': dest, 'newname': name},
+                      path, posixpath.join(dest, name))
+        return self
+
+    def copy(self, path_list, dest):
+        """复制文件或文件夹到 dest 目录，参数同 ``PCS.copy``
+        """
+        for path in path_list:
+            name = posixpath.basename(path.rstrip('/'))
+            self._add('copy', {'path': path, 'dest': dest, 'newname': name},
+                      path, posixpath.join(dest, name))
+        return self
+
+    def rename(self, rename_pair_list):
+        """重命名，参数同 ``PCS.rename``
+        """
+        for path, newname in rename_pair_list:
+            self._add('rename', {'path': path, 'newname': newname}, path,
+                      posixpath.join(posixpath.dirname(path.rstrip('/')), newname))
+        return self
+
+    def delete(self, path_list):
+        """删除文件或文件夹，参数同 ``PCS.delete``
+        """
+        for path in path_list:
+            self._add('delete', path, path)
+        return self
+
+    def barrier(self):
+        """之后加入的操作在之前的操作完成且可见后才执行
+        """
+        if self._stages[-1]:
+            self._stages.append([])
+            self._touched = set()
+            self._touched_parents = set()
+        return self
+
+    def run(self):
+        """执行所有操作
+
+        :return: list -- 与加入的顺序一一对应，每项为
+                 {"opera": 操作, "path": 原路径, "target": 目标路径, "errno": 错误码}，
+                 errno 为0表示成功，为 None 表示因之前的阶段出错而没有执行
+        """
+        stages, self._stages = self._stages, [[]]
+        self._touched, self._touched_parents = set(), set()
+        results = []
+        failed = False
+        for n, stage in enumerate(stages):
+            if failed and not self.ignore_errors:
+                results.extend(self._result(op, None) for op in stage)
+                continue
+            stage_results = self._run_stage(stage)
+            results.extend(stage_results)
+            failed = failed or any(r['errno'] for r in stage_results)
+            if self.wait and n + 1 < len(stages):
+                self.wait_visible(stage_results)
+        self.results = results
+        return results
+
+    @staticmethod
+    def _result(op, errno):
+        opera, item, path, target = op
+        return {'opera': opera, 'path': path, 'target': target, 'errno': errno}
+
+    def _run_stage(self, stage):
+        chunks = []
+        for opera in ('move', 'copy', 'rename', 'delete'):
+            indexes = [i for i, op in enumerate(stage) if op[0] == opera]
+            for i in xrange(0, len(indexes), self.batch_size):
+                chunks.append((opera, indexes[i:i + self.batch_size]))
+
+        def _send(chunk):
+            opera, indexes = chunk
+            ret = self.pcs._filemanager(opera, [stage[i][1] for i in indexes])
+            try:
+                foo = decode_json(ret)
+            except ValueError:
+                foo = {}
+            info = foo.get('info')
+            if isinstance(info, list) and len(info) == len(indexes):
+                return [item.get('errno', 0) for item in info]
+            # 没有每个文件的结果时都使用整个请求的结果
+            errno = foo.get('errno', -1) if ret.ok else -1
+            logging.debug('filemanager %s failed: %s' % (opera, ret.content))
+            return [errno] * len(indexes)
+
+        errnos = [None] * len(stage)
+        pool = ThreadPool(self.workers)
+        try:
+            for (opera, indexes), chunk_errnos in zip(chunks, pool.map(_send, chunks)):
+                for i, errno in zip(indexes, chunk_errnos):
+                    errnos[i] = errno
+        finally:
+            pool.terminate()
+        return [self._result(op, errno) for op, errno in zip(stage, errnos)]
+
+    def wait_visible(self, results=None):
+        """等待成功的操作可见：目标路径存在，被移动、改名和删除的原路径消失
+
+        :param results: ``run`` 返回的结果（或其中一部分），缺省为上次 ``run`` 的全部结果
+        """
+        if results is None:
+            results = self.results
+        # errno 为 None 的操作没有执行，不需要等待
+        ok = [r for r in results if r['errno'] == 0]
+        exist = [r['target'] for r in ok if r['target']]
+        gone = [r['path'] for r in ok if r['opera'] in ('move', 'rename', 'delete')]
+        deadline = time.time() + self.timeout
+        interval = 0.25
+        while exist or gone:
+            infos = self.pcs.meta_batch(exist + gone, workers=self.workers)
+            exist, gone = (
+                [path for path, info in zip(exist, infos) if info.get('errno', 0)],
+                [path for path, info in zip(gone, infos[len(exist):])
+                 if not info.get('errno', 0)])
+            if not (exist or gone):
+                return
+            if time.time() + interval > deadline:
+                logging.debug('filemanager results not visible after %ss: %s' % (
+                    self.timeout, exist + gone))
+                return
+            time.sleep(interval)
+            interval = min(interval * 2, 2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.run()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import pickle
+import logging
+import posixpath
+import threading
+from collections import OrderedDict
+
+from journal import _atomic_write
+
+
+class MetaCache(object):
+    """网盘文件信息缓存
+
+    缓存 ``meta`` 得到的文件信息（以路径和 fs_id 为索引）和 ``list_files``
+    得到的目录列表，条目在 ttl 秒后过期，超过 max_entries 时淘汰最久未使用的条目。
+    ``PCS`` 的 mkdir、move、copy、rename、delete、各种上传及 restore_recycle_bin
+    会自动使受影响的条目失效。
+
+    >>> cache = MetaCache(ttl=300, path='.meta-cache')
+    >>> pcs = PCS('username', 'password', meta_cache=cache)
+    >>> pcs.stat('/foo.txt')
+    >>> pcs.listdir('/')
+
+    :param ttl: 条目的有效时间（秒），默认为60
+    :param max_entries: 文件信息和目录列表各自最多保存的条目数，默认为10万
+    :param path: 保存缓存的文件路径，缺省为只在内存中缓存
+
+        .. note::
+            指定 path 时初始化时读取该文件，调用 ``save`` 时写入。
+    """
+    def __init__(self, ttl=60, max_entries=100000, path=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()
+        self._listings = OrderedDict()
+        self._fs_ids = {}
+        self._lock = threading.RLock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                foo = pickle.load(f)
+        except Exception as e:
+            logging.debug('broken meta cache %s, ignored: %s' % (self.path, e))
+            return
+        now = time.time()
+        for path, (ctime, info) in foo['entries']:
+            if now - ctime < self.ttl:
+                self._set(self._entries, path, (ctime, info))
+                self._fs_ids[info.get('fs_id')] = path
+        for path, (ctime, entries) in foo['listings']:
+            if now - ctime < self.ttl:
+                self._set(self._listings, path, (ctime, entries))
+
+    def save(self):
+        """把缓存写入 path
+        """
+        if not self.path:
+            return
+        with self._lock:
+            content = pickle.dumps({
+                'entries': self._entries.items(),
+                'listings': self._listings.items(),
+            }, pickle.HIGHEST_PROTOCOL)
+        _atomic_write(self.path, content)
+
+    def _set(self, table, key, value):
+        table.pop(key, None)
+        table[key] = value
+        while len(table) > self.max_entries:
+            old, (ctime, info) = table.popitem(last=False)
+            if table is self._entries:
+                self._fs_ids.pop(info.get('fs_id'), None)
+
+    def _get(self, table, key):
+        item = table.get(key)
+        if item is None:
+            return None
+        ctime, value = item
+        if time.time() - ctime >= self.ttl:
+            del table[key]
+            return None
+        # 移到末尾，表示最近使用过
+        table[key] = table.pop(key)
+        return value
+
+    def get(self, path):
+        """返回缓存的文件信息，没有缓存或已过期时返回 None
+        """
+        with self._lock:
+            return self._get(self._entries, path)
+
+    def get_by_fs_id(self, fs_id):
+        """根据 fs_id 返回缓存的文件信息
+        """
+        with self._lock:
+            path = self._fs_ids.get(fs_id)
+            if path is None:
+                return None
+            return self._get(self._entries, path)
+
+    def put(self, info):
+        """缓存一个文件信息（``meta`` 返回的 info 或 ``list_files`` 返回的 list 中的一项）
+        """
+        with self._lock:
+            self._set(self._entries, info['path'], (time.time(), info))
+            if 'fs_id' in info:
+                self._fs_ids[info['fs_id']] = info['path']
+
+    def get_listing(self, path):
+        """返回缓存的目录列表，没有缓存或已过期时返回 None
+        """
+        with self._lock:
+            return self._get(self._listings, path)
+
+    def put_listing(self, path, entries):
+        """缓存目录列表，同时缓存其中每一项的文件信息
+        """
+        with self._lock:
+            self._set(self._listings, path, (time.time(), entries))
+            for info in entries:
+                self.put(info)
+
+    def invalidate(self, path, recursive=False):
+        """使某个路径及其所在目录的列表失效
+
+        :param recursive: 为 True 时同时使该路径下的所有条目失效（用于目录）
+        """
+        prefix = path.rstrip('/') + '/'
+        with self._lock:
+            for table in (self._entries, self._listings):
+                if recursive:
+                    keys = [key for key in table if key == path or key.startswith(prefix)]
+                else:
+                    keys = [path]
+                for key in keys:
+                    item = table.pop(key, None)
+                    if item and table is self._entries:
+                        self._fs_ids.pop(item[1].get('fs_id'), None)
+            self._listings.pop(posixpath.dirname(path.rstrip('/')) or '/', None)
+
+    def invalidate_fs_id(self, fs_id, recursive=False):
+        """根据 fs_id 使条目失效
+        """
+        with self._lock:
+            path = self._fs_ids.get(fs_id)
+            if path is not None:
+                self.invalidate(path, recursive)
+
+    def invalidate_listings(self):
+        """使所有目录列表失效
+        """
+        with self._lock:
+            self._listings.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._listings.clear()
+            self._fs_ids.clear()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import mmap
+import sqlite3
+import threading
+from multiprocessing.pool import ThreadPool
+from hashlib import md5
+from zlib import crc32
+
+# 分片上传的默认块大小，createsuperfile 最多接受 1024 个分片
+BLOCK_SIZE = 4 * 2 ** 20
+MAX_BLOCKS = 1024
+# 秒传的校验段为文件的前 256kb
+SLICE_SIZE = 256 * 1024
+READ_SIZE = 2 ** 20
+
+
+def block_size_for(size, block_size=BLOCK_SIZE):
+    """返回能把 size 字节分成不超过 MAX_BLOCKS 块的块大小
+    """
+    while block_size * MAX_BLOCKS < size:
+        block_size *= 2
+    return block_size
+
+
+def _block_md5(args):
+    """计算文件中一块的 md5，块的起始位置对齐时使用 mmap 避免复制
+    """
+    file, offset, length = args
+    if offset % mmap.ALLOCATIONGRANULARITY == 0:
+        mm = mmap.mmap(file.fileno(), length, access=mmap.ACCESS_READ, offset=offset)
+        try:
+            # hashlib 计算较大的 buffer 时会释放 GIL
+            return md5(mm).hexdigest()
+        finally:
+            mm.close()
+    block_md5 = md5()
+    with open(file.name, 'rb') as f:
+        f.seek(offset)
+        while length:
+            chunk = f.read(min(length, READ_SIZE))
+            if not chunk:
+                break
+            block_md5.update(chunk)
+            length -= len(chunk)
+    return block_md5.hexdigest()
+
+
+class Fingerprint(object):
+    """文件指纹
+
+    一次读取文件同时得到秒传需要的 slice-md5、content-md5、crc32 和文件大小，
+    以及分片上传时 ``check_file_blocks`` 需要的每块 md5 列表。
+    可以同时传给 ``PCS.rapidupload`` 和 ``PCS.upload_file`` ，秒传失败后
+    分片上传不需要再读一遍文件。
+
+    :param size: 文件大小
+    :param slice_md5: 前 256kb 的 md5
+    :param content_md5: 整个文件的 md5
+    :param content_crc32: 整个文件的 crc32（无符号）
+    :param block_size: 分块大小
+    :param block_list: 每块的 md5 列表
+    """
+    def __init__(self, size, slice_md5, content_md5, content_crc32,
+                 block_size, block_list):
+        self.size = size
+        self.slice_md5 = slice_md5
+        self.content_md5 = content_md5
+        self.content_crc32 = content_crc32
+        self.block_size = block_size
+        self.block_list = block_list
+
+    @classmethod
+    def from_file(cls, file, block_size=None, workers=1):
+        """计算文件指纹
+
+        :param file: 本地文件路径或以二进制模式打开的文件对象
+        :param block_size: 分块大小，缺省为4M，文件过大时自动加倍以保证不超过1024块
+        :param workers: 计算分块 md5 的线程数，默认为1即单线程一次读完
+
+            .. note::
+                workers 大于1时，每块的 md5 通过 mmap 在线程池中并行计算，
+                同时当前线程顺序计算秒传所需的整个文件的 md5 和 crc32。
+                适用于读取速度快于单核 md5 速度的磁盘（如 NVMe）。
+        :return: Fingerprint
+        """
+        if isinstance(file, basestring):
+            with open(file, 'rb') as f:
+                return cls.from_file(f, block_size, workers)
+
+        file.seek(0, 2)
+        size = file.tell()
+        file.seek(0)
+        if block_size is None:
+            block_size = block_size_for(size)
+        if workers > 1 and size > block_size and hasattr(file, 'fileno'):
+            return cls._from_file_parallel(file, size, block_size, workers)
+
+        slice_md5 = md5()
+        content_md5 = md5()
+        content_crc32 = 0
+        block_list = []
+        offset = 0
+        while True:
+            block_md5 = md5()
+            remain = block_size
+            while remain:
+                chunk = file.read(min(remain, READ_SIZE))
+                if not chunk:
+                    break
+                if offset < SLICE_SIZE:
+                    slice_md5.update(chunk[:SLICE_SIZE - offset])
+                block_md5.update(chunk)
+                content_md5.update(chunk)
+                content_crc32 = crc32(chunk, content_crc32)
+                offset += len(chunk)
+                remain -= len(chunk)
+            if remain == block_size:
+                break
+            block_list.append(block_md5.hexdigest())
+            if remain:
+                break
+
+        return cls(size, slice_md5.hexdigest(), content_md5.hexdigest(),
+                   content_crc32 & 0xFFFFFFFF, block_size, block_list)
+
+    @classmethod
+    def _from_file_parallel(cls, file, size, block_size, workers):
+        pool = ThreadPool(workers)
+        try:
+            blocks = pool.map_async(_block_md5, [
+                (file, offset, min(block_size, size - offset))
+                for offset in xrange(0, size, block_size)])
+
+            # 秒传需要的整个文件的校验值只能顺序计算
+            slice_md5 = md5()
+            content_md5 = md5()
+            content_crc32 = 0
+            offset = 0
+            while True:
+                chunk = file.read(READ_SIZE)
+                if not chunk:
+                    break
+                if offset < SLICE_SIZE:
+                    slice_md5.update(chunk[:SLICE_SIZE - offset])
+                content_md5.update(chunk)
+                content_crc32 = crc32(chunk, content_crc32)
+                offset += len(chunk)
+            block_list = blocks.get()
+        finally:
+            pool.terminate()
+        return cls(size, slice_md5.hexdigest(), content_md5.hexdigest(),
+                   content_crc32 & 0xFFFFFFFF, block_size, block_list)
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**dict((str(k), v) for k, v in d.items()))
+
+    def __repr__(self):
+        return '<Fingerprint size=%d md5=%s blocks=%d>' % (
+            self.size, self.content_md5, len(self.block_list))
+
+
+class FingerprintCache(object):
+    """本地文件指纹缓存
+
+    用 sqlite 保存 (设备号, inode, 大小, 修改时间) 到文件指纹的映射，
+    文件未修改时不需要重新计算秒传和分片上传所需的各种 md5。
+    条目数超过 max_entries 时淘汰最久未使用的条目。
+
+    :param path: sqlite 数据库文件路径
+    :param max_entries: 最多保存的条目数，默认为100万
+
+    >>> cache = FingerprintCache('.fingerprints.db')
+    >>> pcs = PCS('username', 'password', fingerprint_cache=cache)
+    """
+    # 每隔多少次写操作检查一次是否需要淘汰
+    _EVICT_INTERVAL = 1000
+    # 命中时的访问时间先记在内存中，积累到这么多条或超过这么多秒时一起写入，
+    # 读取时不持有 sqlite 的写锁
+    _FLUSH_SIZE = 1000
+    _FLUSH_INTERVAL = 5
+
+    def __init__(self, path, max_entries=1000000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._atimes = {}
+        self._flushed = time.time()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA synchronous=OFF')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS fingerprints ('
+                           'dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, '
+                           'block_size INTEGER, path TEXT, data TEXT, atime REAL, '
+                           'PRIMARY KEY (dev, ino, size, mtime_ns, block_size))')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS fingerprints_path '
+                           'ON fingerprints (path)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS fingerprints_atime '
+                           'ON fingerprints (atime)')
+        self._conn.commit()
+
+    @staticmethod
+    def _key(st, block_size):
+        if block_size is None:
+            block_size = block_size_for(st.st_size)
+        return (st.st_dev, st.st_ino, st.st_size, int(st.st_mtime * 1e9), block_size)
+
+    @staticmethod
+    def _path(path):
+        path = os.path.abspath(path)
+        if isinstance(path, str):
+            path = path.decode('utf-8', 'replace')
+        return path
+
+    def get(self, path, block_size=None):
+        """返回缓存的指纹，没有缓存或文件已修改时返回 None
+        """
+        key = self._key(os.stat(path), block_size)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM fingerprints WHERE dev=? AND ino=? AND size=? '
+                'AND mtime_ns=? AND block_size=?', key).fetchone()
+            if row is None:
+                return None
+            self._atimes[key] = time.time()
+            if (len(self._atimes) >= self._FLUSH_SIZE or
+                    time.time() - self._flushed > self._FLUSH_INTERVAL):
+                self._flush()
+        return Fingerprint.from_dict(json.loads(row[0]))
+
+    def put(self, path, fingerprint, st=None):
+        """保存文件指纹
+
+        :param st: 计算指纹前的 os.stat 结果，缺省为现在的状态
+        """
+        key = self._key(st or os.stat(path), fingerprint.block_size)
+        with self._lock:
+            self._atimes.pop(key, None)
+            self._conn.execute(
+                'INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                key + (self._path(path), json.dumps(fingerprint.to_dict()), time.time()))
+            self._written()
+            self._conn.commit()
+
+    def fingerprint(self, path, block_size=None, workers=1):
+        """返回文件指纹，优先使用缓存，没有缓存时计算并保存
+
+        :param workers: 同 ``Fingerprint.from_file``
+        """
+        fingerprint = self.get(path, block_size)
+        if fingerprint is None:
+            st = os.stat(path)
+            fingerprint = Fingerprint.from_file(path, block_size, workers)
+            # 计算期间文件被修改时不缓存
+            if self._key(os.stat(path), block_size) == self._key(st, block_size):
+                self.put(path, fingerprint, st)
+        return fingerprint
+
+    def invalidate(self, path):
+        """删除某个文件的所有缓存
+        """
+        with self._lock:
+            self._conn.execute('DELETE FROM fingerprints WHERE path=?',
+                               (self._path(path),))
+            self._conn.commit()
+
+    def clear(self):
+        """清空缓存
+        """
+        with self._lock:
+            self._conn.execute('DELETE FROM fingerprints')
+            self._conn.commit()
+
+    def flush(self):
+        """把内存中的访问时间写入数据库
+        """
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._conn.commit()
+            self._conn.close()
+
+    def _flush(self):
+        self._flushed = time.time()
+        if not self._atimes:
+            return
+        atimes, self._atimes = self._atimes, {}
+        self._conn.executemany(
+            'UPDATE fingerprints SET atime=? WHERE dev=? AND ino=? AND size=? '
+            'AND mtime_ns=? AND block_size=?',
+            [(atime,) + key for key, atime in atimes.items()])
+        self._conn.commit()
+
+    def _written(self):
+        self._writes += 1
+        if self._writes % self._EVICT_INTERVAL:
+            return
+        # 淘汰前写入访问时间，避免淘汰最近用过的条目
+        self._flush()
+        count = self._conn.execute('SELECT COUNT(*) FROM fingerprints').fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                'DELETE FROM fingerprints WHERE rowid IN (SELECT rowid FROM fingerprints '
+                'ORDER BY atime LIMIT ?)', (count - self.max_entries,))
+        self._conn.commit()
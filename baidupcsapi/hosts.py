@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import threading
+
+import requests
+
+
+class HostStats(object):
+    """一个 pcs 服务器的统计信息，延迟和吞吐量均为指数加权移动平均
+    """
+    __slots__ = ('host', 'latency', 'throughput', 'failures', 'last_failure')
+
+    def __init__(self, host):
+        self.host = host
+        self.latency = None
+        self.throughput = None
+        self.failures = 0
+        self.last_failure = 0
+
+    def __repr__(self):
+        return '<HostStats %s latency=%s throughput=%s failures=%d>' % (
+            self.host, self.latency, self.throughput, self.failures)
+
+
+def _ewma(old, new, alpha):
+    if old is None:
+        return new
+    return old + alpha * (new - old)
+
+
+class HostSelector(object):
+    """pcs 服务器选择器
+
+    并发测试各服务器的延迟，并用实际传输中观察到的延迟和吞吐量持续更新，
+    某个服务器变慢或连续出错时选择其它服务器。
+
+    服务器的好坏用传输 sample_size 字节的预计时间（延迟 + 大小 / 吞吐量）衡量。
+    还没有实际传输过（只测试过延迟）的服务器使用其它服务器吞吐量的平均值，
+    否则承担了传输的服务器总是显得比没有用过的服务器慢。
+
+    :param alpha: 指数加权移动平均的系数，越大越偏向最近的观察值
+    :param max_failures: 连续出错多少次后暂时不再使用该服务器
+    :param cooldown: 出错的服务器多少秒后重新参与选择
+    :param switch_ratio: 当前服务器的预计时间超过最好的服务器多少倍时切换
+    :param sample_size: 计算预计时间时使用的传输大小
+    """
+    probe_url = 'http://{0}/monitor.jpg'
+
+    def __init__(self, alpha=0.3, max_failures=3, cooldown=60, switch_ratio=2.0,
+                 sample_size=4 * 2 ** 20):
+        self.alpha = alpha
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.switch_ratio = switch_ratio
+        self.sample_size = sample_size
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def hosts(self):
+        return self._stats.keys()
+
+    def stats(self, host):
+        with self._lock:
+            if host not in self._stats:
+                self._stats[host] = HostStats(host)
+            return self._stats[host]
+
+    def record(self, host, latency=None, throughput=None, ok=True):
+        """记录一次请求的结果
+
+        :param latency: 请求的延迟（秒）
+        :param throughput: 传输速度（字节/秒）
+        :param ok: 请求是否成功
+        """
+        stats = self.stats(host)
+        with self._lock:
+            if not ok:
+                stats.failures += 1
+                stats.last_failure = time.time()
+                return
+            stats.failures = 0
+            if latency is not None:
+                stats.latency = _ewma(stats.latency, latency, self.alpha)
+            if throughput is not None:
+                stats.throughput = _ewma(stats.throughput, throughput, self.alpha)
+
+    def available(self, host):
+        """服务器没有连续出错，或者已经过了冷却时间
+        """
+        stats = self.stats(host)
+        return (stats.failures < self.max_failures or
+                time.time() - stats.last_failure > self.cooldown)
+
+    def _default_throughput(self):
+        with self._lock:
+            known = [stats.throughput for stats in self._stats.values() if stats.throughput]
+        return sum(known) / len(known) if known else None
+
+    def cost(self, host):
+        """传输 sample_size 字节的预计时间，没有数据时为 None
+        """
+        stats = self.stats(host)
+        if stats.latency is None and stats.throughput is None:
+            return None
+        cost = stats.latency or 0
+        throughput = stats.throughput or self._default_throughput()
+        if throughput:
+            cost += float(self.sample_size) / throughput
+        return cost
+
+    def ranking(self):
+        """按预计时间从快到慢返回可用的服务器，没有数据的排在最后
+        """
+        hosts = [host for host in self.hosts() if self.available(host)]
+        return sorted(hosts, key=lambda host: (self.cost(host) is None, self.cost(host)))
+
+    def best(self, n=None):
+        """返回最好的服务器，指定 n 时返回最好的 n 个服务器的列表
+        """
+        ranking = self.ranking()
+        if n is not None:
+            return ranking[:n]
+        return ranking[0] if ranking else None
+
+    def should_switch(self, host):
+        """当前服务器不可用或明显慢于最好的服务器时返回更好的服务器，否则返回 None
+        """
+        best = self.best()
+        if best is None or best == host:
+            return None
+        if not self.available(host):
+            return best
+        cost, best_cost = self.cost(host), self.cost(best)
+        if cost is not None and best_cost is not None and cost > best_cost * self.switch_ratio:
+            return best
+        return None
+
+    def probe(self, hosts, timeout=3.0):
+        """并发测试各服务器的延迟，timeout 秒内没有返回的服务器记为出错
+
+        :param hosts: 服务器列表
+        :return: 测试后最好的服务器
+        """
+        results = {}
+
+        def _probe(host):
+            start = time.time()
+            try:
+                requests.get(self.probe_url.format(host), timeout=timeout)
+            except requests.RequestException as e:
+                logging.info('TEST %s failed: %s' % (host, e))
+                return
+            results[host] = time.time() - start
+            logging.info('TEST %s %s ms' % (host, int(results[host] * 1000)))
+
+        threads = []
+        for host in hosts:
+            thread = threading.Thread(target=_probe, args=(host,))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        deadline = time.time() + timeout
+        for thread in threads:
+            thread.join(max(0, deadline - time.time()))
+
+        for host in hosts:
+            if host in results:
+                self.record(host, latency=results[host])
+            else:
+                self.record(host, ok=False)
+        return self.best()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import logging
+import threading
+from hashlib import md5
+
+
+def _atomic_write(path, content):
+    """先写临时文件再改名，保证进程崩溃时日志文件要么是旧的要么是新的
+    """
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp, path)
+
+
+def _journal_path(local_path, remote_path, suffix, state_dir=None):
+    local_path = os.path.abspath(local_path)
+    if state_dir:
+        key = md5(('%s\n%s' % (local_path, remote_path)).encode('utf-8')).hexdigest()
+        return os.path.join(state_dir, key + suffix)
+    dirname, basename = os.path.split(local_path)
+    return os.path.join(dirname, '.%s%s' % (basename, suffix))
+
+
+class UploadJournal(object):
+    """分片上传日志
+
+    记录本地文件的标识（路径、大小、修改时间、inode）和已经上传成功的块的 md5，
+    保存在源文件旁边（或 state_dir 中）。进程崩溃后重新上传同一文件时，
+    标识一致则使用日志中的块的 md5 ，不再重新计算；是否需要上传以服务器
+    返回的缺少的块为准（服务器上的临时块可能已经过期）。
+    """
+    suffix = '.pcsupload'
+
+    def __init__(self, local_path, remote_path, block_size, state_dir=None):
+        st = os.stat(local_path)
+        self.path = _journal_path(local_path, remote_path, self.suffix, state_dir)
+        # 经过一次 json 转换，便于和读回的日志比较
+        self.identity = json.loads(json.dumps({
+            'local_path': os.path.abspath(local_path),
+            'remote_path': remote_path,
+            'size': st.st_size,
+            'mtime': repr(st.st_mtime),
+            'inode': st.st_ino,
+            'block_size': block_size,
+        }))
+        self.blocks = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                foo = json.loads(f.read())
+        except ValueError:
+            logging.debug('broken upload journal %s, ignored' % self.path)
+            return
+        if foo.get('identity') != self.identity:
+            logging.debug('%s changed since last upload, journal discarded' %
+                          self.identity['local_path'])
+            return
+        self.blocks = dict((int(k), v) for k, v in foo['blocks'].items())
+
+    def _save(self):
+        _atomic_write(self.path, json.dumps({
+            'identity': self.identity,
+            'blocks': self.blocks,
+        }))
+
+    def get(self, idx):
+        """返回第 idx 块已上传的 md5，没有上传过则返回 None
+        """
+        return self.blocks.get(idx)
+
+    def done(self, idx, block_md5):
+        """记录第 idx 块已上传成功
+        """
+        with self._lock:
+            self.blocks[idx] = block_md5
+            self._save()
+
+    def discard(self, indexes):
+        """删除这些块的记录（服务器上已经没有这些块）
+        """
+        if not indexes:
+            return
+        with self._lock:
+            for idx in indexes:
+                self.blocks.pop(idx, None)
+            self._save()
+
+    def remove(self):
+        """上传完成后删除日志
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class DownloadJournal(object):
+    """分段下载日志
+
+    用位图记录已经下载完成的区间，保存在目标文件旁边（或 state_dir 中）。
+    日志中同时记录远程文件的大小、md5 和 server_mtime，远程文件改变时
+    丢弃已下载的内容从头开始。
+    """
+    suffix = '.pcsdownload'
+
+    def __init__(self, local_path, remote_path, info, part_size, state_dir=None):
+        self.path = _journal_path(local_path, remote_path, self.suffix, state_dir)
+        self.identity = json.loads(json.dumps({
+            'remote_path': remote_path,
+            'size': info['size'],
+            'md5': info.get('md5'),
+            'server_mtime': info.get('server_mtime'),
+            'part_size': part_size,
+        }))
+        self.parts = (info['size'] + part_size - 1) // part_size
+        self.bitmap = bytearray((self.parts + 7) // 8)
+        self._lock = threading.Lock()
+        self.resumed = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'rb') as f:
+                foo = json.loads(f.read())
+            bitmap = bytearray(foo['bitmap'].decode('hex'))
+        except (ValueError, KeyError, TypeError):
+            logging.debug('broken download journal %s, ignored' % self.path)
+            return False
+        if foo.get('identity') != self.identity or len(bitmap) != len(self.bitmap):
+            logging.debug('%s changed on server, restart download' %
+                          self.identity['remote_path'])
+            return False
+        self.bitmap = bitmap
+        return True
+
+    def _save(self):
+        _atomic_write(self.path, json.dumps({
+            'identity': self.identity,
+            'bitmap': str(self.bitmap).encode('hex'),
+        }))
+
+    def is_done(self, idx):
+        return bool(self.bitmap[idx >> 3] & (1 << (idx & 7)))
+
+    def done(self, idx):
+        """记录第 idx 个区间已下载完成
+        """
+        with self._lock:
+            self.bitmap[idx >> 3] |= 1 << (idx & 7)
+            self._save()
+
+    def reset(self):
+        """清空位图，从头下载
+        """
+        with self._lock:
+            self.bitmap = bytearray(len(self.bitmap))
+            self.resumed = False
+            self._save()
+
+    def remove(self):
+        """下载完成后删除日志
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+
+from hosts import _ewma
+
+
+class AdaptiveLimiter(object):
+    """自适应并发限制（AIMD）
+
+    限制同时进行的请求数。请求正常且延迟没有明显增加时，每经过约一个
+    窗口的请求把限制加1（加性增）；遇到限流、超时或 5xx 时把限制乘以
+    backoff （乘性减），一个往返时间内最多减一次，避免同一批并发请求的失败
+    把限制一下减到最小。
+
+    ``PCS`` 为 pan.baidu.com 的元数据请求和 pcs 服务器的数据传输各使用一个
+    限制器（``pcs.limiters['pan']`` 和 ``pcs.limiters['pcs']``），
+    最大值为对应的连接池大小。上层可以使用较多的线程，实际并发数由限制器决定。
+    ``download_file`` 的分段下载在读完或关闭响应后才释放；调用者自己使用的
+    流式响应（``stream=True``）收到响应头后就释放，不限制其传输。
+
+    :param initial: 初始并发数，默认为4
+    :param min_limit: 最小并发数，默认为1
+    :param max_limit: 最大并发数，默认为32
+    :param backoff: 乘性减的系数，默认为0.5
+    :param tolerance: 平滑后的延迟超过最小延迟的多少倍时不再增加，默认为2
+    :param alpha: 延迟的指数加权移动平均系数，默认为0.2
+    """
+    def __init__(self, initial=4, min_limit=1, max_limit=32, backoff=0.5, tolerance=2.0,
+                 alpha=0.2):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.alpha = alpha
+        self.inflight = 0
+        self.latency = None
+        self.min_latency = None
+        self._last_decrease = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """等待直到同时进行的请求数小于限制
+        """
+        with self._cond:
+            while self.inflight >= max(1, min(int(self.limit), self.max_limit)):
+                self._cond.wait()
+            self.inflight += 1
+
+    def release(self, latency=None, congested=False):
+        """请求完成
+
+        :param latency: 请求的延迟（秒），大小差别很大的请求（如上传）传 None
+        :param congested: 是否遇到限流、超时或服务器错误
+        """
+        with self._cond:
+            saturated = self.inflight >= int(self.limit)
+            self.inflight -= 1
+            if latency is not None:
+                self.latency = _ewma(self.latency, latency, self.alpha)
+                # 最小延迟缓慢上升，网络变化后可以重新找到基准
+                if self.min_latency is None or latency < self.min_latency:
+                    self.min_latency = latency
+                else:
+                    self.min_latency *= 1.01
+            now = time.time()
+            if congested:
+                if now - self._last_decrease > (self.latency or 0):
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif saturated and self.healthy():
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def healthy(self):
+        """平滑后的延迟没有明显高于最小延迟
+        """
+        if self.latency is None or not self.min_latency:
+            return True
+        return self.latency <= self.min_latency * self.tolerance
+
+    def __repr__(self):
+        return '<AdaptiveLimiter limit=%.1f inflight=%d latency=%s>' % (
+            self.limit, self.inflight, self.latency)
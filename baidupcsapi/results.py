@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+
+
+def decode_json(response):
+    """返回响应的 json 内容，解析结果保存在 response 上，同一个响应只解析一次
+
+    :param response: requests.Response 或 Result
+    :raises ValueError: 内容不是 json，或者是还没有读取的流式响应
+    """
+    if isinstance(response, Result):
+        response = response.response
+    if '_pcs_json' in response.__dict__:
+        return response._pcs_json
+    # 流式下载时读取内容会消耗响应
+    if response._content is False:
+        raise ValueError('streamed response is not decoded')
+    response._pcs_json = json.loads(response.content)
+    return response._pcs_json
+
+
+def _field(name, convert=None, doc=None):
+    def getter(self):
+        value = self._data.get(name)
+        if convert is not None and value is not None:
+            value = convert(value)
+        return value
+    return property(getter, doc=doc or name)
+
+
+class Entry(object):
+    """json 中一项的轻量包装，字段在访问时才读取和转换
+
+    也可以像 dict 一样用 ``entry['path']`` 读取原始字段。
+    """
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def to_dict(self):
+        return self._data
+
+    def __eq__(self, other):
+        return isinstance(other, Entry) and self._data == other._data
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class FileEntry(Entry):
+    """网盘中的一个文件或目录（``list_files`` 、``meta`` 等返回的一项）
+    """
+    __slots__ = ()
+
+    path = _field('path')
+    name = _field('server_filename', doc='文件名（不含路径）')
+    fs_id = _field('fs_id')
+    size = _field('size')
+    isdir = _field('isdir', bool)
+    md5 = _field('md5')
+    category = _field('category')
+    block_list = _field('block_list')
+    mtime = _field('server_mtime', doc='服务器修改时间')
+    ctime = _field('server_ctime', doc='服务器创建时间')
+
+    def __repr__(self):
+        return '<FileEntry %s%s>' % (self.path, '/' if self.isdir else '')
+
+
+class Task(Entry):
+    """一个离线下载任务（``list_download_tasks`` 返回的一项）
+    """
+    __slots__ = ()
+
+    task_id = _field('task_id')
+    name = _field('task_name')
+    status = _field('status', int)
+    source_url = _field('source_url')
+    save_path = _field('save_path')
+    create_time = _field('create_time', int)
+
+    def __repr__(self):
+        return '<Task %s %s>' % (self.task_id, self.name)
+
+
+class Result(object):
+    """接口返回的结果
+
+    第一次访问字段时才解析 json ，解析结果缓存在响应上。其它属性
+    （content、status_code、headers 等）与 requests.Response 相同。
+    """
+    def __init__(self, response):
+        self.response = response
+
+    @property
+    def data(self):
+        """解析后的 json
+        """
+        return decode_json(self.response)
+
+    @property
+    def errno(self):
+        """errno 或 error_code ，成功时为0
+        """
+        data = self.data
+        return data.get('errno', data.get('error_code', 0))
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    def __repr__(self):
+        return '<%s [%s]>' % (type(self).__name__, self.response.status_code)
+
+
+class Quota(Result):
+    """空间配额（``quota`` 的结果）
+    """
+    @property
+    def total(self):
+        return self.data.get('total')
+
+    @property
+    def used(self):
+        return self.data.get('used')
+
+    @property
+    def free(self):
+        return self.total - self.used
+
+
+class FileResult(Result):
+    """返回单个文件信息的结果（``mkdir`` 、``upload`` 等）
+    """
+    @property
+    def entry(self):
+        return FileEntry(self.data)
+
+
+class ListResult(Result):
+    """返回列表的结果，可以直接迭代其中的每一项
+
+    :attr key: 列表在 json 中的名字
+    :attr entry_type: 每一项的类型
+    """
+    key = 'list'
+    entry_type = FileEntry
+
+    @property
+    def entries(self):
+        if '_entries' not in self.__dict__:
+            self._entries = [self.entry_type(item)
+                             for item in self.data.get(self.key) or []]
+        return self._entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class FileList(ListResult):
+    """文件列表（``list_files`` 、``search`` 、``list_recycle_bin`` 的结果）
+    """
+
+
+class MetaList(ListResult):
+    """文件信息列表（``meta`` 、``list_streams`` 的结果）
+    """
+    key = 'info'
+
+
+class TaskList(ListResult):
+    """离线下载任务列表（``list_download_tasks`` 的结果）
+    """
+    key = 'task_info'
+    entry_type = Task
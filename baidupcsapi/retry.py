@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+import threading
+
+import requests
+
+from results import decode_json
+
+# 重复执行结果相同的请求，(uri, method)
+IDEMPOTENT = set([
+    ('quota', None),
+    ('list', 'list'),
+    ('categorylist', 'list'),
+    ('search', 'search'),
+    ('thumbnail', 'generate'),
+    ('filemetas?blocks=1', 'filemetas'),
+    ('precreate', 'post'),
+    ('file', 'download'),
+    ('recycle', 'list'),
+    ('cloud_dl', 'query_sinfo'),
+    ('services/cloud_dl', 'query_task'),
+    ('services/cloud_dl', 'list_task'),
+])
+
+
+# 服务器错误、限流的 HTTP 状态码和 errno
+RETRY_STATUSES = (500, 502, 503, 504)
+RATE_LIMIT_STATUSES = (429,)
+RATE_LIMIT_ERRNOS = (31034,)
+
+
+def response_errno(response):
+    """返回 json 响应中的 errno （或 error_code ），不是 json 时返回 None
+    """
+    try:
+        foo = decode_json(response)
+    except ValueError:
+        return None
+    if not isinstance(foo, dict):
+        return None
+    return foo.get('errno', foo.get('error_code'))
+
+
+def is_congested(response=None, error=None, stream=False):
+    """请求是否遇到了限流、超时或服务器错误
+    """
+    if error is not None:
+        return isinstance(error, (requests.exceptions.ConnectionError,
+                                  requests.exceptions.Timeout))
+    if response.status_code in RATE_LIMIT_STATUSES + RETRY_STATUSES:
+        return True
+    # 流式下载时读取内容会消耗响应，不检查 errno
+    return not stream and response_errno(response) in RATE_LIMIT_ERRNOS
+
+
+def is_idempotent(uri, method, params=None, data=None):
+    """请求是否可以安全地重复执行
+
+    查询类接口、上传分片（按内容寻址）和覆盖已有文件的秒传可以重复执行；
+    创建目录、合并分片、filemanager、离线下载、另存一份（newcopy）的秒传等
+    会修改网盘内容的请求不能重复执行。
+
+    :param params: 请求的 url 参数
+    :param data: 请求的表单数据
+    """
+    if uri == 'file' and method == 'upload':
+        return (params or {}).get('type') == 'tmpfile'
+    if uri == 'rapidupload':
+        return (data or {}).get('ondup') == 'overwrite'
+    return (uri, method) in IDEMPOTENT
+
+
+class RetryPolicy(object):
+    """请求的重试策略
+
+    * 可以重复执行的请求（见 ``is_idempotent``）在连接出错、超时和 5xx 时重试；
+      其它请求只在连接没有建立（请求没有发出）时重试；
+    * 服务器限流（HTTP 429 或 errno 31034）时所有请求都重试，
+      有 Retry-After 时按其等待；
+    * 第 n 次重试前等待 0 到 backoff * 2 ** n 秒之间的随机时间（不超过 max_backoff）；
+    * 重试预算：每个请求增加 budget_ratio 次重试机会，最多积累 max_budget 次，
+      每次重试消耗一次，机会用完时不再重试，避免大量请求同时失败时重试风暴。
+
+    可以在构造 ``PCS`` 时通过 retry_policy 参数指定，也可以在调用任何方法时
+    通过 ``retry=`` 参数为单次调用指定，``retry=False`` 表示不重试。
+
+    :param retries: 单个请求最多重试的次数，默认为3
+    :param backoff: 退避的基础时间（秒），默认为0.5
+    :param max_backoff: 最长等待时间（秒），默认为30
+    :param budget_ratio: 每个请求增加的重试机会，默认为0.2
+    :param max_budget: 最多积累的重试机会（也是初始的机会数），默认为10
+    """
+    retry_statuses = RETRY_STATUSES
+    rate_limit_statuses = RATE_LIMIT_STATUSES
+    rate_limit_errnos = RATE_LIMIT_ERRNOS
+
+    def __init__(self, retries=3, backoff=0.5, max_backoff=30, budget_ratio=0.2,
+                 max_budget=10):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget_ratio = budget_ratio
+        self.max_budget = max_budget
+        self._tokens = float(max_budget)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        """每个请求调用一次，增加重试机会
+        """
+        with self._lock:
+            self._tokens = min(self._tokens + self.budget_ratio, self.max_budget)
+
+    def withdraw(self):
+        """消耗一次重试机会，没有机会时返回 False
+        """
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def delay(self, attempt, retry_after=None):
+        """第 attempt 次（从0开始）重试前等待的秒数
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return max(0.0, float(response.headers.get('Retry-After')))
+        except (TypeError, ValueError):
+            return None
+
+    def classify(self, response=None, error=None, idempotent=True, stream=False):
+        """判断一次请求的结果是否应该重试
+
+        :return: (是否重试, 服务器要求等待的秒数或 None)
+        """
+        if error is not None:
+            if isinstance(error, requests.exceptions.ConnectTimeout):
+                return True, None
+            if idempotent and isinstance(error, (requests.exceptions.ConnectionError,
+                                                 requests.exceptions.Timeout,
+                                                 requests.exceptions.ChunkedEncodingError)):
+                return True, None
+            return False, None
+        if response.status_code in self.rate_limit_statuses:
+            return True, self._retry_after(response)
+        if response.status_code in self.retry_statuses:
+            return idempotent, self._retry_after(response)
+        # 流式下载时读取内容会消耗响应，不检查 errno
+        if not stream and response_errno(response) in self.rate_limit_errnos:
+            return True, self._retry_after(response)
+        return False, None
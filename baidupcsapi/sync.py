@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import posixpath
+
+
+def _unicode(path):
+    if isinstance(path, str):
+        return path.decode('utf-8')
+    return path
+
+
+def _parents(rel):
+    while True:
+        rel = posixpath.dirname(rel)
+        if not rel:
+            return
+        yield rel
+
+
+def scan_local(local_dir):
+    """扫描本地目录
+
+    :return: (files, dirs) -- files 为 {相对路径: (大小, 修改时间)}，
+             dirs 为相对路径的 set，相对路径以 / 分隔
+    """
+    files = {}
+    dirs = set()
+    local_dir = _unicode(local_dir)
+    for dirpath, dirnames, filenames in os.walk(local_dir):
+        rel_dir = os.path.relpath(dirpath, local_dir).replace(os.sep, '/')
+        if rel_dir == '.':
+            rel_dir = u''
+        for name in dirnames:
+            dirs.add(posixpath.join(rel_dir, name))
+        for name in filenames:
+            st = os.stat(os.path.join(dirpath, name))
+            files[posixpath.join(rel_dir, name)] = (st.st_size, st.st_mtime)
+    return files, dirs
+
+
+def scan_remote(walk, remote_dir):
+    """扫描网盘目录
+
+    :param walk: ``PCS.walk`` 或参数相同的函数
+    :return: (files, dirs) -- 都是 {相对路径: ``list_files`` 返回的项}
+    """
+    files = {}
+    dirs = {}
+    prefix = remote_dir.rstrip('/') + '/'
+    for dirpath, dirnames, filenames in walk(remote_dir):
+        for table, entries in ((dirs, dirnames), (files, filenames)):
+            for entry in entries:
+                table[entry['path'][len(prefix):]] = entry
+    return files, dirs
+
+
+def plan_up(local, remote, fingerprint, delete=False, checksum=False):
+    """根据扫描结果计划上传需要的操作
+
+    :param local: ``scan_local`` 的结果
+    :param remote: ``scan_remote`` 的结果
+    :param fingerprint: 以相对路径为参数返回本地文件 Fingerprint 的函数
+    :return: 按执行顺序排列的操作列表，见 ``PCS.sync_up``
+    """
+    local_files, local_dirs = local
+    remote_files, remote_dirs = remote
+
+    # 本地是文件远程是目录（或相反）时先删除远程的
+    conflicts = sorted([rel for rel in local_files if rel in remote_dirs] +
+                       [rel for rel in local_dirs if rel in remote_files])
+
+    puts = []
+    for rel in sorted(local_files):
+        size, mtime = local_files[rel]
+        entry = remote_files.get(rel)
+        if entry is None or rel in conflicts:
+            puts.append(rel)
+            continue
+        if entry.get('size') != size:
+            puts.append(rel)
+            continue
+        # 上传之后没有修改过的文件不需要计算 md5
+        if not checksum and mtime <= entry.get('server_mtime', 0):
+            continue
+        if entry.get('md5') != fingerprint(rel).content_md5:
+            puts.append(rel)
+
+    removed = [rel for rel in remote_files
+               if rel not in local_files and rel not in local_dirs]
+
+    # 远程多出的文件和新增的本地文件内容相同且文件名相同时移动而不是重新上传
+    moves = []
+    if delete:
+        candidates = {}
+        for rel in removed:
+            entry = remote_files[rel]
+            if entry.get('md5'):
+                key = (posixpath.basename(rel), entry['size'], entry['md5'])
+                candidates.setdefault(key, []).append(rel)
+        for rel in list(puts):
+            if rel in remote_files:
+                continue
+            size = local_files[rel][0]
+            key = (posixpath.basename(rel), size)
+            if not any(k[:2] == key for k in candidates):
+                continue
+            sources = candidates.get(key + (fingerprint(rel).content_md5,))
+            if sources:
+                source = sources.pop()
+                moves.append((source, rel))
+                puts.remove(rel)
+                removed.remove(source)
+
+    # 上传时会自动创建所在目录，只需要为空目录和移动的目标目录调用 mkdir
+    created = set()
+    for rel in puts:
+        created.update(_parents(rel))
+    required = set()
+    for source, rel in moves:
+        required.update(_parents(rel))
+    mkdirs = []
+    for rel in sorted(local_dirs, key=lambda rel: -rel.count('/')):
+        if rel in remote_dirs and rel not in conflicts:
+            continue
+        if rel in created and rel not in required:
+            continue
+        mkdirs.append(rel)
+        created.update(_parents(rel))
+        required.difference_update(_parents(rel))
+    mkdirs.reverse()
+
+    deletes = []
+    if delete:
+        removed_dirs = set(rel for rel in remote_dirs if rel not in local_dirs
+                           and rel not in local_files)
+        for rel in sorted(removed_dirs) + sorted(removed):
+            # 所在目录会被删除时不需要单独删除
+            if any(parent in removed_dirs or parent in conflicts
+                   for parent in _parents(rel)):
+                continue
+            deletes.append(rel)
+
+    return ([('delete', rel) for rel in conflicts] +
+            [('mkdir', rel) for rel in mkdirs] +
+            [('move', source, rel) for source, rel in moves] +
+            [('put', rel) for rel in puts] +
+            [('delete', rel) for rel in deletes])
+
+
+def plan_down(remote, local, fingerprint, delete=False, checksum=False):
+    """根据扫描结果计划下载需要的操作
+
+    :param remote: ``scan_remote`` 的结果
+    :param local: ``scan_local`` 的结果
+    :param fingerprint: 以相对路径为参数返回本地文件 Fingerprint 的函数
+    :return: 按执行顺序排列的操作列表，见 ``PCS.sync_down``
+    """
+    remote_files, remote_dirs = remote
+    local_files, local_dirs = local
+
+    # 远程是文件本地是目录（或相反）时先删除本地的
+    conflicts = sorted([rel for rel in remote_files if rel in local_dirs] +
+                       [rel for rel in remote_dirs if rel in local_files])
+
+    mkdirs = sorted(rel for rel in remote_dirs
+                    if rel not in local_dirs or rel in conflicts)
+
+    transfers = []
+    for rel in sorted(remote_files):
+        entry = remote_files[rel]
+        if rel not in local_files or rel in conflicts:
+            transfers.append(('download', rel))
+            continue
+        size, mtime = local_files[rel]
+        if size == entry.get('size'):
+            # 下载后本地文件的修改时间设为远程文件的 server_mtime
+            if not checksum and int(mtime) == entry.get('server_mtime'):
+                continue
+            if fingerprint(rel).content_md5 == entry.get('md5'):
+                continue
+        transfers.append(('patch', rel))
+
+    deletes = []
+    if delete:
+        removed_dirs = set(rel for rel in local_dirs if rel not in remote_dirs
+                           and rel not in remote_files)
+        removed = [rel for rel in local_files
+                   if rel not in remote_files and rel not in remote_dirs]
+        for rel in sorted(removed_dirs) + sorted(removed):
+            if any(parent in removed_dirs or parent in conflicts
+                   for parent in _parents(rel)):
+                continue
+            deletes.append(rel)
+
+    return ([('delete', rel) for rel in conflicts] +
+            [('mkdir', rel) for rel in mkdirs] +
+            transfers +
+            [('delete', rel) for rel in deletes])
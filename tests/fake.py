@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""不访问网络的 PCS ，``_send`` 由测试替换
+"""
+
+import io
+import re
+import json
+import hashlib
+import posixpath
+import threading
+from urlparse import urlparse
+
+import requests
+
+from baidupcsapi import PCS
+from baidupcsapi.fingerprint import block_size_for
+
+
+def response(obj=None, status_code=200, content=None, stream=False, url=None):
+    """构造 requests.Response ，stream 为 True 时内容还没有读取
+    """
+    if content is None:
+        content = json.dumps(obj if obj is not None else {'errno': 0})
+    ret = requests.Response()
+    ret.status_code = status_code
+    ret.url = url or 'https://pcs.example.com/rest/2.0/pcs/file'
+    if stream:
+        ret.raw = io.BytesIO(content)
+    else:
+        ret._content = content
+        ret._content_consumed = True
+    return ret
+
+
+def make_pcs(send=None, **kwargs):
+    """已经“登录”、选择了 pcs 服务器的 PCS
+
+    :param send: 代替 ``_send`` 的函数，参数为 (uri, url, params, data, files, callback, **kwargs)
+    """
+    kwargs.setdefault('cache_ttl', 0)
+    pcs = PCS('username', 'password', lazy=True, **kwargs)
+    pcs.user.update({'BDUSS': 'bduss', 'token': 'token'})
+    pcs._initiated = True
+    pcs.pcs_server = 'pcs.example.com'
+    if send is not None:
+        pcs._send = send
+    return pcs
+
+
+class FakeServer(object):
+    """在内存中模拟网盘，用作 PCS 的 ``_send``
+
+    只实现测试用到的接口。``fail(uri, method, host, params, kwargs)`` 返回
+    Response 或抛出异常时代替正常的处理，用于模拟出错的服务器。
+
+    :attr files: {路径: 内容}
+    :attr blocks: 已上传的分片，{md5: 内容}
+    :attr calls: [(uri, method, host)]
+    """
+    def __init__(self, files=None):
+        self.files = dict(files or {})
+        self.blocks = {}
+        self.calls = []
+        self.fail = None
+        self._lock = threading.Lock()
+
+    def __call__(self, uri, url, params, data=None, files=None, callback=None, **kwargs):
+        method = params.get('method')
+        host = urlparse(url).netloc
+        with self._lock:
+            self.calls.append((uri, method, host))
+        if self.fail is not None:
+            ret = self.fail(uri, method, host, params, kwargs)
+            if ret is not None:
+                return ret
+        handler = getattr(self, '_%s_%s' % (uri.split('?')[0], method), None)
+        if handler is None:
+            return response({'errno': 0})
+        return handler(params, data or {}, files or {}, url, callback=callback, **kwargs)
+
+    def _info(self, path):
+        content = self.files[path]
+        block_size = block_size_for(len(content))
+        return {'errno': 0, 'path': path, 'server_filename': posixpath.basename(path),
+                'size': len(content), 'md5': hashlib.md5(content).hexdigest(),
+                'fs_id': abs(hash(path)) % 10 ** 12, 'isdir': 0, 'server_mtime': 1,
+                'block_list': [hashlib.md5(content[i:i + block_size]).hexdigest()
+                               for i in xrange(0, len(content) or 1, block_size)]}
+
+    def _save(self, path, content, ondup):
+        with self._lock:
+            if path in self.files and ondup == 'newcopy':
+                root, ext = posixpath.splitext(path)
+                path = '%s_copy%s' % (root, ext)
+            self.files[path] = content
+        return response(self._info(path))
+
+    def _file_upload(self, params, data, files, url, **kwargs):
+        name, fh = files['file']
+        content = fh.read()
+        if kwargs.get('callback'):
+            kwargs['callback'](size=len(content), progress=len(content))
+        if params.get('type') == 'tmpfile':
+            block_md5 = hashlib.md5(content).hexdigest()
+            with self._lock:
+                self.blocks[block_md5] = content
+            return response({'md5': block_md5})
+        return self._save(posixpath.join(params['dir'], params['filename']), content,
+                          params.get('ondup'))
+
+    def _file_createsuperfile(self, params, data, files, url, **kwargs):
+        block_list = json.loads(data['param'])['block_list']
+        if any(block_md5 not in self.blocks for block_md5 in block_list):
+            return response({'error_code': 31363, 'error_msg': 'block miss'}, 400)
+        return self._save(params['path'], ''.join(self.blocks[b] for b in block_list),
+                          params.get('ondup'))
+
+    def _file_download(self, params, data, files, url, **kwargs):
+        content = self.files.get(params['path'])
+        stream = kwargs.get('stream', False)
+        if content is None:
+            return response({'error_code': 31066}, 404, stream=stream, url=url)
+        rng = (kwargs.get('headers') or {}).get('Range')
+        if rng:
+            start, end = re.match(r'bytes=(\d+)-(\d*)', rng).groups()
+            end = int(end) if end else len(content) - 1
+            return response(content=content[int(start):end + 1], status_code=206,
+                            stream=stream, url=url)
+        return response(content=content, stream=stream, url=url)
+
+    def _precreate_post(self, params, data, files, url, **kwargs):
+        block_list = json.loads(data['block_list'])
+        return response({'errno': 0, 'block_list': [b for b in block_list
+                                                    if b not in self.blocks]})
+
+    def _rapidupload_rapidupload(self, params, data, files, url, **kwargs):
+        if int(data['content-length']) < 256 * 1024:
+            return response({'errno': 2})
+        if data['path'] in self.files and data.get('ondup') not in ('overwrite', 'newcopy'):
+            return response({'errno': -8})
+        for content in self.files.values():
+            if hashlib.md5(content).hexdigest() == data['content-md5']:
+                return self._save(data['path'], content, data.get('ondup'))
+        return response({'errno': 404})
+
+    def _filemetas_filemetas(self, params, data, files, url, **kwargs):
+        info = [self._info(path) if path in self.files else {'errno': -9}
+                for path in json.loads(data['target'])]
+        return response({'errno': 12 if any(i['errno'] for i in info) else 0,
+                         'info': info})
+
+    def _create_post(self, params, data, files, url, **kwargs):
+        return response({'errno': 0, 'path': data['path'], 'isdir': 1})
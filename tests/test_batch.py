@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import unittest
+
+import requests
+
+from baidupcsapi.batch import FileManagerBatch
+
+
+def _response(obj, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(obj)
+    return response
+
+
+class FakePCS(object):
+    """记录 filemanager 请求，meta_batch 按 files 返回路径是否存在
+    """
+    def __init__(self, errnos=None):
+        self.calls = []
+        self.files = set()
+        self.errnos = errnos or {}
+        self.metas = []
+
+    def _filemanager(self, opera, filelist):
+        self.calls.append((opera, filelist))
+        info = []
+        for item in filelist:
+            path = item if isinstance(item, basestring) else item['path']
+            info.append({'path': path, 'errno': self.errnos.get(path, 0)})
+        return _response({'errno': 0, 'info': info})
+
+    def meta_batch(self, paths, workers=4):
+        self.metas.append(paths)
+        return [{'path': p} if p in self.files else {'path': p, 'errno': -9}
+                for p in paths]
+
+
+class StagingTest(unittest.TestCase):
+
+    cases = [
+        # (操作, 各阶段的操作类型)
+        ([('delete', ['/a/b']), ('delete', ['/a/c'])], [['delete', 'delete']]),
+        ([('delete', ['/a/b']), ('delete', ['/a/b/c'])], [['delete'], ['delete']]),
+        ([('delete', ['/a/b/c']), ('move', ['/a'], '/x')], [['delete'], ['move']]),
+        ([('delete', ['/a/b/c']), ('move', ['/q'], '/a')], [['delete', 'move']]),
+        ([('move', ['/a/1'], '/b'), ('rename', [('/b/1', '2')])], [['move'], ['rename']]),
+        ([('copy', ['/a/1'], '/b'), ('delete', ['/a/1'])], [['copy'], ['delete']]),
+        ([('delete', ['/a/b']), ('delete', ['/'])], [['delete'], ['delete']]),
+        ([('delete', ['/a/']), ('delete', ['/a/b'])], [['delete'], ['delete']]),
+    ]
+
+    def test_stages(self):
+        for ops, expected in self.cases:
+            batch = FileManagerBatch(FakePCS())
+            for op in ops:
+                getattr(batch, op[0])(*op[1:])
+            stages = [[op[0] for op in stage] for stage in batch._stages]
+            self.assertEqual(stages, expected, ops)
+
+    def test_barrier(self):
+        batch = FileManagerBatch(FakePCS())
+        batch.delete(['/a']).barrier().barrier().delete(['/b'])
+        self.assertEqual(len(batch._stages), 2)
+
+
+class RunTest(unittest.TestCase):
+
+    def test_chunks_and_order(self):
+        pcs = FakePCS()
+        batch = FileManagerBatch(pcs, batch_size=2, wait=False)
+        batch.delete(['/1', '/2', '/3'])
+        batch.move(['/4'], '/x')
+        results = batch.run()
+        self.assertEqual([r['path'] for r in results], ['/1', '/2', '/3', '/4'])
+        self.assertEqual(sorted(len(filelist) for opera, filelist in pcs.calls), [1, 1, 2])
+        self.assertEqual(results[3]['target'], '/x/4')
+
+    def test_failed_stage_stops_later_stages(self):
+        pcs = FakePCS(errnos={'/a/b': -9})
+        batch = FileManagerBatch(pcs, wait=False)
+        batch.delete(['/a/b'])
+        batch.delete(['/a'])
+        results = batch.run()
+        self.assertEqual([r['errno'] for r in results], [-9, None])
+        self.assertEqual(len(pcs.calls), 1)
+
+    def test_ignore_errors(self):
+        pcs = FakePCS(errnos={'/a/b': -9})
+        batch = FileManagerBatch(pcs, wait=False, ignore_errors=True)
+        batch.delete(['/a/b'])
+        batch.delete(['/a'])
+        self.assertEqual([r['errno'] for r in batch.run()], [-9, 0])
+
+    def test_whole_request_failure(self):
+        pcs = FakePCS()
+        pcs._filemanager = lambda opera, filelist: _response({'errno': 12})
+        batch = FileManagerBatch(pcs, wait=False)
+        batch.delete(['/1', '/2'])
+        self.assertEqual([r['errno'] for r in batch.run()], [12, 12])
+
+    def test_wait_visible(self):
+        pcs = FakePCS()
+        pcs.files.update(['/x/1'])
+        batch = FileManagerBatch(pcs, timeout=1)
+        batch.move(['/1'], '/x')
+        batch.run()
+        # 目标已存在、原路径已消失，不需要等待
+        batch.wait_visible()
+
+    def test_wait_visible_skips_unexecuted(self):
+        pcs = FakePCS()
+        batch = FileManagerBatch(pcs, timeout=1)
+        batch.wait_visible([
+            {'opera': 'move', 'path': '/1', 'target': '/x/1', 'errno': None},
+            {'opera': 'delete', 'path': '/2', 'target': None, 'errno': -9},
+        ])
+        self.assertEqual(pcs.metas, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
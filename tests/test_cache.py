@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from baidupcsapi.cache import MetaCache
+from tests.fake import FakeServer, make_pcs
+
+
+def _info(path, fs_id):
+    return {'path': path, 'fs_id': fs_id, 'isdir': 0}
+
+
+class MetaCacheTest(unittest.TestCase):
+
+    def test_get_and_fs_id(self):
+        cache = MetaCache()
+        cache.put(_info('/a/b', 1))
+        self.assertEqual(cache.get('/a/b')['fs_id'], 1)
+        self.assertEqual(cache.get_by_fs_id(1)['path'], '/a/b')
+        self.assertEqual(cache.get('/a/c'), None)
+
+    def test_expire(self):
+        cache = MetaCache(ttl=0.05)
+        cache.put(_info('/a', 1))
+        time.sleep(0.1)
+        self.assertEqual(cache.get('/a'), None)
+
+    def test_invalidate(self):
+        cache = MetaCache()
+        cache.put_listing('/a', [_info('/a/b', 1), _info('/a/bc', 2)])
+        cache.put_listing('/a/b', [_info('/a/b/c', 3)])
+        cache.invalidate('/a/b', recursive=True)
+        self.assertEqual(cache.get('/a/b'), None)
+        self.assertEqual(cache.get('/a/b/c'), None)
+        self.assertEqual(cache.get_by_fs_id(3), None)
+        self.assertEqual(cache.get_listing('/a/b'), None)
+        # 所在目录的列表失效，名字相同前缀的兄弟不受影响
+        self.assertEqual(cache.get_listing('/a'), None)
+        self.assertEqual(cache.get('/a/bc')['fs_id'], 2)
+
+    def test_lru(self):
+        cache = MetaCache(max_entries=2)
+        cache.put(_info('/1', 1))
+        cache.put(_info('/2', 2))
+        cache.get('/1')
+        cache.put(_info('/3', 3))
+        self.assertEqual([cache.get(p) is not None for p in ('/1', '/2', '/3')],
+                         [True, False, True])
+        self.assertEqual(cache.get_by_fs_id(2), None)
+
+    def test_save(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'cache')
+            cache = MetaCache(path=path)
+            cache.put_listing('/a', [_info('/a/b', 1)])
+            cache.save()
+            cache = MetaCache(path=path)
+            self.assertEqual(cache.get_listing('/a'), [_info('/a/b', 1)])
+            self.assertEqual(cache.get_by_fs_id(1)['path'], '/a/b')
+            with open(path, 'wb') as f:
+                f.write('broken')
+            self.assertEqual(MetaCache(path=path).get('/a/b'), None)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class PCSMetaCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeServer({'/a/b': 'content'})
+        self.pcs = make_pcs(self.server, meta_cache=MetaCache())
+
+    def _metas(self):
+        return [c for c in self.server.calls if c[1] == 'filemetas']
+
+    def test_stat_cached_and_invalidated(self):
+        self.assertEqual(self.pcs.stat('/a/b')['size'], 7)
+        self.pcs.stat('/a/b')
+        self.assertEqual(len(self._metas()), 1)
+        self.pcs.upload('/a', io.BytesIO('changed!'), 'b', ondup='overwrite')
+        self.assertEqual(self.pcs.stat('/a/b')['size'], 8)
+        self.assertEqual(len(self._metas()), 2)
+
+    def test_delete_invalidates(self):
+        self.pcs.stat('/a/b')
+        self.pcs.delete(['/a'])
+        self.assertEqual(self.pcs.meta_cache.get('/a/b'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests
+
+from tests.fake import FakeServer, make_pcs, response
+
+CONTENT = ''.join(chr(i % 251) for i in xrange(10000))
+
+
+class DownloadFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.local = os.path.join(self.tmpdir, 'a.bin')
+        self.server = FakeServer({'/a.bin': CONTENT})
+        self.pcs = make_pcs(self.server)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _read(self):
+        with open(self.local, 'rb') as f:
+            return f.read()
+
+    def test_ranges(self):
+        info = self.pcs.download_file('/a.bin', self.local, connections=3, part_size=1024)
+        self.assertEqual(info['size'], len(CONTENT))
+        self.assertEqual(self._read(), CONTENT)
+        ranges = [c for c in self.server.calls if c[1] == 'download']
+        self.assertEqual(len(ranges), 10)
+
+    def test_server_ignores_range(self):
+        def fail(uri, method, host, params, kwargs):
+            if method == 'download':
+                return response(content=CONTENT, stream=True)
+        self.server.fail = fail
+        self.pcs.download_file('/a.bin', self.local, part_size=len(CONTENT))
+        self.assertEqual(self._read(), CONTENT)
+
+    def test_stream_not_buffered(self):
+        ret = self.pcs.download('/a.bin', stream=True)
+        self.assertIs(ret._content, False)
+        self.assertEqual(ret.raw.read(), CONTENT)
+
+    def test_failover_to_other_host(self):
+        def fail(uri, method, host, params, kwargs):
+            if method == 'download' and host == 'bad.example.com':
+                raise requests.ConnectionError('reset')
+        self.server.fail = fail
+        self.pcs.download_file('/a.bin', self.local, connections=2, part_size=1024,
+                               hosts=['bad.example.com', 'good.example.com'])
+        self.assertEqual(self._read(), CONTENT)
+        self.assertFalse(self.pcs.host_selector.stats('bad.example.com').throughput)
+
+    def test_stats_recorded_under_striped_host(self):
+        # good.example.com 把请求重定向到 cdn.example.com
+        def fail(uri, method, host, params, kwargs):
+            if method == 'download':
+                ret = self.server._file_download(params, {}, {}, '', **kwargs)
+                ret.url = 'https://cdn.example.com/file'
+                return ret
+        self.server.fail = fail
+        self.pcs.download_file('/a.bin', self.local, connections=2, part_size=1024,
+                               hosts=['good.example.com'])
+        self.assertEqual(self._read(), CONTENT)
+        self.assertTrue(self.pcs.host_selector.stats('good.example.com').throughput)
+        self.assertFalse(self.pcs.host_selector.stats('cdn.example.com').throughput)
+
+    def test_truncated_range_fails(self):
+        def fail(uri, method, host, params, kwargs):
+            if method == 'download':
+                return response(content='short', status_code=206, stream=True)
+        self.server.fail = fail
+        self.assertRaises(Exception, self.pcs.download_file, '/a.bin', self.local,
+                          part_size=1024)
+
+
+class StripeConnectionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pcs = make_pcs()
+        selector = self.pcs.host_selector
+        selector.record('a', throughput=10 * 1024 * 1024)
+        selector.record('b', throughput=1024 * 1024)
+        selector.record('c', throughput=1024 * 1024)
+
+    def test_total_is_connections(self):
+        cases = [
+            (['a', 'b', 'c'], 1),
+            (['a', 'b', 'c'], 2),
+            (['a', 'b', 'c'], 3),
+            (['a', 'b', 'c'], 4),
+            (['a', 'b', 'c', 'd'], 5),
+            (['a', 'b'], 16),
+            (['c', 'd'], 3),
+            ([None], 4),
+        ]
+        for hosts, connections in cases:
+            counts = self.pcs._stripe_connections(hosts, connections)
+            self.assertEqual(sum(count for _, count in counts), connections,
+                             (hosts, connections, counts))
+            self.assertTrue(all(count >= 1 for _, count in counts))
+
+    def test_fewer_connections_than_hosts_uses_fastest_first(self):
+        counts = self.pcs._stripe_connections(['a', 'b', 'c'], 2)
+        self.assertEqual(counts, [('a', 1), ('b', 1)])
+
+    def test_faster_host_gets_more(self):
+        counts = dict(self.pcs._stripe_connections(['a', 'b'], 8))
+        self.assertTrue(counts['a'] > counts['b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from baidupcsapi.fingerprint import Fingerprint, FingerprintCache
+
+
+class FingerprintCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = os.path.join(self.dir, 'fp.db')
+        self.files = []
+        for i in range(3):
+            path = os.path.join(self.dir, '%d.bin' % i)
+            with open(path, 'wb') as f:
+                f.write(str(i) * 1000)
+            self.files.append(path)
+        self.cache = FingerprintCache(self.db)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.dir)
+
+    def test_hit_and_modified(self):
+        path = self.files[0]
+        fingerprint = self.cache.fingerprint(path)
+        self.assertEqual(fingerprint.content_md5, Fingerprint.from_file(path).content_md5)
+        self.assertEqual(self.cache.get(path).to_dict(), fingerprint.to_dict())
+        with open(path, 'ab') as f:
+            f.write('x')
+        os.utime(path, (1, 1))
+        self.assertEqual(self.cache.get(path), None)
+
+    def test_hits_do_not_hold_write_lock(self):
+        for path in self.files:
+            self.cache.fingerprint(path)
+        for _ in range(10):
+            for path in self.files:
+                self.assertNotEqual(self.cache.get(path), None)
+        other = sqlite3.connect(self.db, timeout=0.1)
+        try:
+            other.execute('DELETE FROM fingerprints WHERE path=?', (u'/nonexistent',))
+            other.commit()
+        finally:
+            other.close()
+
+    def test_atime_flushed(self):
+        self.cache.fingerprint(self.files[0])
+        before = self.cache._conn.execute('SELECT atime FROM fingerprints').fetchone()[0]
+        self.cache.get(self.files[0])
+        self.cache.flush()
+        after = self.cache._conn.execute('SELECT atime FROM fingerprints').fetchone()[0]
+        self.assertTrue(after >= before)
+        self.assertEqual(self.cache._atimes, {})
+
+    def test_eviction_keeps_recently_used(self):
+        self.cache.max_entries = 2
+        self.cache._EVICT_INTERVAL = 1
+        self.cache.fingerprint(self.files[0])
+        self.cache.fingerprint(self.files[1])
+        self.cache.get(self.files[0])
+        self.cache.fingerprint(self.files[2])
+        self.assertNotEqual(self.cache.get(self.files[0]), None)
+        self.assertEqual(self.cache.get(self.files[1]), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
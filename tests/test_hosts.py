@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from baidupcsapi.hosts import HostSelector
+
+
+class HostSelectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.selector = HostSelector(max_failures=2)
+        self.selector.record('A', latency=0.05)
+        self.selector.record('B', latency=0.08)
+
+    def test_probe_ranking(self):
+        self.assertEqual(self.selector.ranking(), ['A', 'B'])
+        self.selector.stats('C')
+        # 没有数据的排在最后
+        self.assertEqual(self.selector.ranking(), ['A', 'B', 'C'])
+
+    def test_transfer_does_not_favor_untried_hosts(self):
+        self.selector.record('A', throughput=20 * 2 ** 20)
+        self.assertEqual(self.selector.should_switch('A'), None)
+        self.assertEqual(self.selector.best(), 'A')
+
+    def test_switch_when_much_slower(self):
+        cases = [
+            # (A 的吞吐量, B 的吞吐量, should_switch('A'))
+            (20 * 2 ** 20, None, None),
+            (20 * 2 ** 20, 10 * 2 ** 20, None),
+            (1 * 2 ** 20, 20 * 2 ** 20, 'B'),
+        ]
+        for a, b, expected in cases:
+            selector = HostSelector()
+            selector.record('A', latency=0.05, throughput=a)
+            selector.record('B', latency=0.08, throughput=b)
+            self.assertEqual(selector.should_switch('A'), expected, (a, b))
+
+    def test_failures(self):
+        self.selector.record('A', ok=False)
+        self.assertTrue(self.selector.available('A'))
+        self.selector.record('A', ok=False)
+        self.assertFalse(self.selector.available('A'))
+        self.assertEqual(self.selector.should_switch('A'), 'B')
+        self.assertEqual(self.selector.ranking(), ['B'])
+        # 成功后清零
+        self.selector.record('A', latency=0.05)
+        self.assertTrue(self.selector.available('A'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from baidupcsapi.journal import UploadJournal, DownloadJournal
+
+
+class JournalTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.local = os.path.join(self.dir, 'file.bin')
+        with open(self.local, 'wb') as f:
+            f.write('x' * 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+class UploadJournalTest(JournalTestCase):
+
+    def test_resume(self):
+        journal = UploadJournal(self.local, '/r/file.bin', 10)
+        journal.done(0, 'a')
+        journal.done(3, 'b')
+        journal = UploadJournal(self.local, '/r/file.bin', 10)
+        self.assertEqual(journal.get(0), 'a')
+        self.assertEqual(journal.get(3), 'b')
+        self.assertEqual(journal.get(1), None)
+
+    def test_identity_changes(self):
+        cases = [
+            ('remote path', lambda: UploadJournal(self.local, '/r/other.bin', 10)),
+            ('block size', lambda: UploadJournal(self.local, '/r/file.bin', 20)),
+        ]
+        for name, make in cases:
+            journal = UploadJournal(self.local, '/r/file.bin', 10)
+            journal.done(0, 'a')
+            self.assertEqual(make().get(0), None, name)
+
+    def test_file_modified(self):
+        UploadJournal(self.local, '/r/file.bin', 10).done(0, 'a')
+        with open(self.local, 'ab') as f:
+            f.write('y')
+        self.assertEqual(UploadJournal(self.local, '/r/file.bin', 10).get(0), None)
+
+    def test_discard(self):
+        journal = UploadJournal(self.local, '/r/file.bin', 10)
+        journal.done(0, 'a')
+        journal.done(1, 'b')
+        journal.discard([0])
+        journal = UploadJournal(self.local, '/r/file.bin', 10)
+        self.assertEqual((journal.get(0), journal.get(1)), (None, 'b'))
+
+    def test_broken_and_state_dir(self):
+        state_dir = os.path.join(self.dir, 'state')
+        os.mkdir(state_dir)
+        journal = UploadJournal(self.local, '/r/file.bin', 10, state_dir)
+        self.assertEqual(os.path.dirname(journal.path), state_dir)
+        with open(journal.path, 'wb') as f:
+            f.write('{broken')
+        self.assertEqual(UploadJournal(self.local, '/r/file.bin', 10, state_dir).blocks, {})
+        journal.remove()
+        self.assertFalse(os.path.exists(journal.path))
+
+
+class DownloadJournalTest(JournalTestCase):
+    info = {'size': 100, 'md5': 'm', 'server_mtime': 1}
+
+    def test_bitmap(self):
+        journal = DownloadJournal(self.local, '/r/file.bin', self.info, 10)
+        self.assertEqual(journal.parts, 10)
+        self.assertFalse(journal.resumed)
+        for idx in (0, 7, 9):
+            journal.done(idx)
+        journal = DownloadJournal(self.local, '/r/file.bin', self.info, 10)
+        self.assertTrue(journal.resumed)
+        self.assertEqual([i for i in range(10) if journal.is_done(i)], [0, 7, 9])
+        journal.reset()
+        self.assertFalse(any(journal.is_done(i) for i in range(10)))
+
+    def test_remote_changed(self):
+        DownloadJournal(self.local, '/r/file.bin', self.info, 10).done(0)
+        cases = [
+            dict(self.info, md5='n'),
+            dict(self.info, server_mtime=2),
+            dict(self.info, size=200),
+        ]
+        for info in cases:
+            journal = DownloadJournal(self.local, '/r/file.bin', info, 10)
+            self.assertFalse(journal.resumed, info)
+            self.assertFalse(journal.is_done(0), info)
+
+
+if __name__ == '__main__':
+    unittest.main()
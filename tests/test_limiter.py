@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+
+import requests
+
+from baidupcsapi.limiter import AdaptiveLimiter
+
+from tests.fake import make_pcs, response
+
+
+def _round(limiter, latency=0.1, congested=False):
+    """占满限制后全部释放一次
+    """
+    n = int(limiter.limit)
+    for _ in range(n):
+        limiter.acquire()
+    for _ in range(n):
+        limiter.release(latency, congested)
+
+
+class AdaptiveLimiterTest(unittest.TestCase):
+
+    def test_additive_increase(self):
+        limiter = AdaptiveLimiter(initial=4, max_limit=8)
+        _round(limiter)
+        self.assertTrue(4 < limiter.limit <= 5, limiter)
+        for _ in range(50):
+            _round(limiter)
+        self.assertEqual(limiter.limit, 8)
+
+    def test_no_increase_when_not_saturated(self):
+        limiter = AdaptiveLimiter(initial=4)
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release(0.1)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_no_increase_when_latency_grows(self):
+        limiter = AdaptiveLimiter(initial=4, tolerance=2.0)
+        _round(limiter, latency=0.1)
+        limit = limiter.limit
+        for _ in range(10):
+            _round(limiter, latency=1.0)
+        self.assertFalse(limiter.healthy())
+        self.assertEqual(limiter.limit, limit)
+
+    def test_multiplicative_decrease_once_per_rtt(self):
+        limiter = AdaptiveLimiter(initial=16, min_limit=2, backoff=0.5)
+        limiter.latency = 60
+        for _ in range(4):
+            limiter.acquire()
+        for _ in range(4):
+            limiter.release(None, congested=True)
+        self.assertEqual(limiter.limit, 8)
+        for _ in range(10):
+            limiter._last_decrease = 0
+            limiter.acquire()
+            limiter.release(None, congested=True)
+        self.assertEqual(limiter.limit, 2)
+
+    def test_acquire_blocks_at_limit(self):
+        limiter = AdaptiveLimiter(initial=1)
+        limiter.acquire()
+        acquired = threading.Event()
+
+        def _acquire():
+            limiter.acquire()
+            acquired.set()
+        thread = threading.Thread(target=_acquire)
+        thread.daemon = True
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        limiter.release()
+        self.assertTrue(acquired.wait(1))
+
+
+class RequestLimiterTest(unittest.TestCase):
+    """通过 ``_request`` 使用限制器
+    """
+
+    def setUp(self):
+        self.sent = []
+
+        def _send(uri, url, params, data=None, files=None, callback=None, **kwargs):
+            self.sent.append(params.get('method'))
+            return response(content='x' * 100, stream=kwargs.get('stream', False))
+        self.pcs = make_pcs(_send)
+        self.limiter = self.pcs.limiters['pcs']
+
+    def _call(self, target, *args, **kwargs):
+        result = []
+
+        def _run():
+            try:
+                result.append((True, target(*args, **kwargs)))
+            except Exception as e:
+                result.append((False, e))
+        thread = threading.Thread(target=_run)
+        thread.daemon = True
+        thread.start()
+        thread.join(2)
+        self.assertFalse(thread.is_alive(), 'request blocked: %r' % self.limiter)
+        ok, value = result[0]
+        if not ok:
+            raise value
+        return value
+
+    def test_caller_streams_release_on_headers(self):
+        for _ in range(int(self.limiter.limit) + 2):
+            ret = self._call(self.pcs.download, '/a', stream=True)
+            ret.raw.read()
+        self.assertEqual(self.limiter.inflight, 0)
+
+    def test_held_streams_release_on_close_or_end(self):
+        first = self.pcs.download('/a', stream=True, _hold_slot=True)
+        second = self.pcs.download('/a', stream=True, _hold_slot=True)
+        self.assertEqual(self.limiter.inflight, 2)
+        first.close()
+        first.close()
+        self.assertEqual(self.limiter.inflight, 1)
+        self.assertEqual(''.join(second.iter_content(10)), 'x' * 100)
+        self.assertEqual(self.limiter.inflight, 0)
+
+    def test_held_streams_bound_concurrency(self):
+        self.limiter.limit = 1
+        held = self.pcs.download('/a', stream=True, _hold_slot=True)
+        blocked = threading.Thread(target=self.pcs.download, args=('/a',))
+        blocked.daemon = True
+        blocked.start()
+        blocked.join(0.2)
+        self.assertTrue(blocked.is_alive())
+        held.close()
+        blocked.join(2)
+        self.assertFalse(blocked.is_alive())
+
+    def test_host_selects_limiter(self):
+        self.pcs.quota()
+        self.pcs.download('/a')
+        self.assertEqual(self.sent, [None, 'download'])
+        self.assertEqual((self.pcs.limiters['pan'].inflight, self.limiter.inflight), (0, 0))
+        # 非流式下载的耗时不是延迟
+        self.assertEqual(self.limiter.latency, None)
+        self.assertNotEqual(self.pcs.limiters['pan'].latency, None)
+
+    def test_errors_release(self):
+        def _send(*args, **kwargs):
+            raise requests.exceptions.InvalidURL()
+        self.pcs._send = _send
+        for _ in range(int(self.limiter.limit) + 2):
+            self.assertRaises(requests.RequestException, self._call, self.pcs.download, '/a')
+        self.assertEqual(self.limiter.inflight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import unittest
+
+from baidupcsapi.listing import FileTable
+from baidupcsapi.results import FileEntry
+
+
+def _entry(path, fs_id, size=0, isdir=0, md5=None, mtime=0):
+    return {'path': path, 'server_filename': path.rsplit('/', 1)[1], 'fs_id': fs_id,
+            'size': size, 'server_mtime': mtime, 'server_ctime': 1, 'isdir': isdir,
+            'category': 6, 'md5': md5}
+
+
+class FileTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.entries = [
+            _entry(u'/b/文件.txt', 10 ** 14, 300, md5=hashlib.md5('1').hexdigest()),
+            _entry(u'/a', 5, isdir=1),
+            _entry(u'/a/x', 7, 100, md5=hashlib.md5('2').hexdigest()),
+            _entry(u'/b', 6, isdir=1),
+            _entry(u'/a/y', 3, 200),
+        ]
+        self.table = FileTable(self.entries)
+
+    def test_round_trip(self):
+        self.assertEqual(len(self.table), 5)
+        for row, entry in zip(self.table, self.entries):
+            self.assertEqual(row.to_dict(), entry)
+        self.assertEqual(self.table[-1].path, u'/a/y')
+        self.assertRaises(IndexError, lambda: self.table[5])
+
+    def test_append_kinds(self):
+        table = FileTable()
+        table.append(FileEntry(self.entries[0]))
+        table.append(self.table[2])
+        self.assertEqual([row.fs_id for row in table], [10 ** 14, 7])
+        # 不是合法 md5 时记为没有 md5
+        table.append(_entry(u'/c', 8, md5='xyz'))
+        self.assertEqual(table[2].md5, None)
+
+    def test_find(self):
+        cases = [(10 ** 14, u'/b/文件.txt'), (3, u'/a/y'), (5, u'/a'), (4, None), (0, None)]
+        for fs_id, path in cases:
+            row = self.table.find(fs_id)
+            self.assertEqual(row and row.path, path, fs_id)
+        self.table.append(_entry(u'/c', 4))
+        self.assertEqual(self.table.find(4).path, u'/c')
+
+    def test_sort(self):
+        cases = [
+            ('path', False, [u'/a', u'/a/x', u'/a/y', u'/b', u'/b/文件.txt']),
+            ('size', True, [u'/b/文件.txt', u'/a/y', u'/a/x', u'/a', u'/b']),
+            ('fs_id', False, [u'/a/y', u'/a', u'/b', u'/a/x', u'/b/文件.txt']),
+            (lambda row: row.name, False, [u'/a', u'/b', u'/a/x', u'/a/y', u'/b/文件.txt']),
+        ]
+        for key, reverse, expected in cases:
+            self.table.sort(key, reverse=reverse)
+            self.assertEqual([row.path for row in self.table], expected, key)
+            # 排序后按 fs_id 查找仍然正确
+            self.assertEqual(self.table.find(7).path, u'/a/x')
+        self.assertRaises(ValueError, self.table.sort, 'unknown')
+
+    def test_filter(self):
+        self.assertEqual([row.path for row in self.table.filter(lambda row: row.size > 150)],
+                         [u'/b/文件.txt', u'/a/y'])
+        self.assertEqual([row.path for row in self.table.dirs()], [u'/a', u'/b'])
+        self.assertEqual(len(self.table.files()), 3)
+        self.assertEqual(self.table.files().find(10 ** 14).md5, hashlib.md5('1').hexdigest())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import unittest
+
+from baidupcsapi import PCSError
+from baidupcsapi.cache import MetaCache
+from tests.fake import FakeServer, make_pcs, response
+
+
+class MetaBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.paths = ['/%03d' % i for i in xrange(25)]
+        self.server = FakeServer(dict((path, path) for path in self.paths[::2]))
+        self.pcs = make_pcs(self.server, meta_cache=MetaCache())
+
+    def test_order_and_errors(self):
+        infos = self.pcs.meta_batch(self.paths, batch_size=4, workers=3)
+        self.assertEqual([info['path'] for info in infos], self.paths)
+        self.assertEqual([info.get('errno', 0) for info in infos],
+                         [0 if i % 2 == 0 else -9 for i in xrange(25)])
+        self.assertEqual(len(self.server.calls), 7)
+        # 只缓存成功的结果
+        self.assertEqual(self.pcs.meta_cache.get('/000')['size'], 4)
+        self.assertEqual(self.pcs.meta_cache.get('/001'), None)
+
+    def test_batch_failure(self):
+        def fail(uri, method, host, params, kwargs):
+            return response({'errno': 31066}, 404)
+        self.server.fail = fail
+        self.assertRaises(PCSError, self.pcs.meta_batch, self.paths, batch_size=10)
+
+    def test_batch_size(self):
+        targets = []
+
+        def send(uri, url, params, data=None, *args, **kwargs):
+            targets.append(len(json.loads(data['target'])))
+            return self.server(uri, url, params, data, *args, **kwargs)
+        self.pcs._send = send
+        self.pcs.meta_batch(self.paths, batch_size=10)
+        self.assertEqual(sorted(targets), [5, 10, 10])
+
+
+if __name__ == '__main__':
+    unittest.main()
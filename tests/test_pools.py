@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from tests.fake import make_pcs
+
+
+class ConfigurePoolsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pcs = make_pcs()
+        self.pcs.set_pcs_server('pcs.example.com')
+        self.closed = []
+
+    def _adapters(self):
+        adapters = dict(self.pcs._adapters)
+        for adapter in adapters.values():
+            if not hasattr(adapter, '_closed_by_test'):
+                adapter._closed_by_test = True
+                adapter.close = lambda adapter=adapter: self.closed.append(adapter)
+        return adapters
+
+    def test_only_changed_pools_are_replaced(self):
+        before = self._adapters()
+        self.pcs.configure_pools(pan=before['https://pan.baidu.com/']._pool_maxsize + 5)
+        after = self._adapters()
+        changed = [prefix for prefix in before if before[prefix] is not after[prefix]]
+        self.assertEqual(sorted(changed), ['http://pan.baidu.com/', 'https://pan.baidu.com/'])
+        self.assertEqual(self.closed, [before['https://pan.baidu.com/']])
+        self.assertEqual(after['https://pan.baidu.com/']._pool_maxsize,
+                         self.pcs.pool_sizes['pan'])
+        self.assertEqual(self.pcs.limiters['pan'].max_limit, self.pcs.pool_sizes['pan'])
+
+    def test_same_sizes_keep_everything(self):
+        before = self._adapters()
+        self.pcs.configure_pools(**self.pcs.pool_sizes)
+        self.pcs.set_pcs_server('pcs.example.com')
+        self.assertEqual(self._adapters(), before)
+        self.assertEqual(self.closed, [])
+
+    def test_default_pool(self):
+        before = self._adapters()
+        self.pcs.configure_pools(default=50)
+        after = self._adapters()
+        self.assertTrue(after['http://'] is after['https://'])
+        self.assertEqual(after['https://']._pool_maxsize, 50)
+        self.assertEqual(self.closed, [before['https://']])
+
+    def test_sessions_pick_up_new_pools(self):
+        session = self.pcs.session
+        self.pcs.configure_pools(pcs=64)
+        self.assertEqual(self.pcs.session.get_adapter(
+            'https://pcs.example.com/rest/2.0/pcs/file')._pool_maxsize, 64)
+        self.assertTrue(self.pcs.session is session)
+
+
+if __name__ == '__main__':
+    unittest.main()
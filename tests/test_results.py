@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from baidupcsapi.results import (decode_json, FileEntry, Quota, FileList, MetaList,
+                                 TaskList)
+from tests.fake import FakeServer, make_pcs, response
+
+
+class DecodeJsonTest(unittest.TestCase):
+
+    def test_cached(self):
+        ret = response({'errno': 0})
+        self.assertIs(decode_json(ret), decode_json(ret))
+
+    def test_stream_not_read(self):
+        ret = response({'errno': 0}, stream=True)
+        self.assertRaises(ValueError, decode_json, ret)
+        self.assertIs(ret._content, False)
+
+    def test_not_json(self):
+        self.assertRaises(ValueError, decode_json, response(content='<html>'))
+
+
+class ResultTest(unittest.TestCase):
+
+    def test_entry(self):
+        entry = FileEntry({'path': '/a', 'server_filename': 'a', 'isdir': 1,
+                           'server_mtime': 5})
+        self.assertEqual((entry.path, entry.name, entry.isdir, entry.mtime),
+                         ('/a', 'a', True, 5))
+        self.assertEqual(entry.size, None)
+        self.assertEqual(entry['path'], '/a')
+        self.assertTrue('isdir' in entry)
+        self.assertEqual(entry, FileEntry(entry.to_dict()))
+
+    def test_result(self):
+        quota = Quota(response({'total': 10, 'used': 3}))
+        self.assertEqual((quota.errno, quota.free, quota.status_code), (0, 7, 200))
+        self.assertEqual(Quota(response({'error_code': 31045})).errno, 31045)
+
+    def test_lists(self):
+        files = FileList(response({'list': [{'path': '/a'}, {'path': '/b'}]}))
+        self.assertEqual([entry.path for entry in files], ['/a', '/b'])
+        self.assertEqual(len(MetaList(response({'info': [{'path': '/a'}]}))), 1)
+        self.assertEqual(len(FileList(response({'errno': -9}))), 0)
+        tasks = TaskList(response({'task_info': [{'task_id': '1', 'status': '0'}]}))
+        self.assertEqual([(task.task_id, task.status) for task in tasks], [('1', 0)])
+
+
+class TypedResultTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeServer({'/a': 'content'})
+
+    def test_default_untyped(self):
+        pcs = make_pcs(self.server)
+        self.assertEqual(type(pcs.meta(['/a'])).__name__, 'Response')
+        self.assertEqual(list(pcs.meta(['/a'], typed=True))[0].size, 7)
+
+    def test_typed(self):
+        pcs = make_pcs(self.server, typed=True)
+        ret = pcs.meta(['/a'])
+        self.assertTrue(isinstance(ret, MetaList))
+        self.assertEqual(ret.entries[0].path, '/a')
+        self.assertEqual(type(pcs.meta(['/a'], typed=False)).__name__, 'Response')
+
+
+if __name__ == '__main__':
+    unittest.main()
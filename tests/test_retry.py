@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import unittest
+
+import requests
+
+from baidupcsapi.retry import RetryPolicy, is_idempotent, is_congested
+
+from tests.fake import make_pcs
+
+
+def _response(status_code=200, obj=None, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(obj if obj is not None else {'errno': 0})
+    response._content_consumed = True
+    response.headers.update(headers or {})
+    return response
+
+
+class ClassifyTest(unittest.TestCase):
+
+    cases = [
+        # (说明, 参数, 是否幂等, 结果)
+        ('ok', dict(response=_response()), True, (False, None)),
+        ('503 idempotent', dict(response=_response(503)), True, (True, None)),
+        ('503 not idempotent', dict(response=_response(503)), False, (False, None)),
+        ('429 with Retry-After', dict(response=_response(429, headers={'Retry-After': '3'})),
+         False, (True, 3.0)),
+        ('bad Retry-After', dict(response=_response(429, headers={'Retry-After': 'x'})),
+         True, (True, None)),
+        ('errno 31034', dict(response=_response(200, {'errno': 31034})), False, (True, None)),
+        ('other errno', dict(response=_response(200, {'errno': -9})), True, (False, None)),
+        ('connect timeout', dict(error=requests.exceptions.ConnectTimeout()), False,
+         (True, None)),
+        ('connection error idempotent', dict(error=requests.exceptions.ConnectionError()),
+         True, (True, None)),
+        ('connection error not idempotent', dict(error=requests.exceptions.ConnectionError()),
+         False, (False, None)),
+        ('read timeout', dict(error=requests.exceptions.ReadTimeout()), True, (True, None)),
+        ('invalid url', dict(error=requests.exceptions.InvalidURL()), True, (False, None)),
+    ]
+
+    def test_classify(self):
+        policy = RetryPolicy()
+        for name, kwargs, idempotent, expected in self.cases:
+            self.assertEqual(policy.classify(idempotent=idempotent, **kwargs), expected, name)
+
+    def test_stream_does_not_read_errno(self):
+        response = _response(200, {'errno': 31034})
+        self.assertEqual(RetryPolicy().classify(response, stream=True), (False, None))
+        self.assertFalse(is_congested(response, stream=True))
+        self.assertTrue(is_congested(response))
+
+
+class BudgetTest(unittest.TestCase):
+
+    def test_budget(self):
+        policy = RetryPolicy(budget_ratio=0.5, max_budget=2)
+        self.assertTrue(policy.withdraw())
+        self.assertTrue(policy.withdraw())
+        self.assertFalse(policy.withdraw())
+        policy.deposit()
+        self.assertFalse(policy.withdraw())
+        policy.deposit()
+        self.assertTrue(policy.withdraw())
+        for _ in range(10):
+            policy.deposit()
+        self.assertEqual(policy._tokens, 2)
+
+    def test_delay(self):
+        policy = RetryPolicy(backoff=1, max_backoff=5)
+        for attempt in range(6):
+            self.assertTrue(0 <= policy.delay(attempt) <= min(5, 2 ** attempt))
+        self.assertEqual(policy.delay(0, retry_after=60), 5)
+
+
+class IdempotentTest(unittest.TestCase):
+
+    cases = [
+        ('list', 'list', None, None, True),
+        ('filemanager', 'delete', None, None, False),
+        ('create', 'createsuperfile', None, None, False),
+        ('file', 'upload', {'type': 'tmpfile'}, None, True),
+        ('file', 'upload', {'path': '/a'}, None, False),
+        ('file', 'download', None, None, True),
+        ('rapidupload', 'rapidupload', None, {'ondup': 'overwrite'}, True),
+        ('rapidupload', 'rapidupload', None, {'ondup': 'newcopy'}, False),
+        ('rapidupload', 'rapidupload', None, {'path': '/a'}, False),
+    ]
+
+    def test_is_idempotent(self):
+        for uri, method, params, data, expected in self.cases:
+            self.assertEqual(is_idempotent(uri, method, params, data), expected,
+                             (uri, method, data))
+
+
+class RequestRetryTest(unittest.TestCase):
+    """通过 ``_request`` 重试，``_send`` 依次返回 outcomes 中的结果
+    """
+
+    def _pcs(self, outcomes, **kwargs):
+        self.sent = []
+        outcomes = list(outcomes)
+
+        def _send(uri, url, params, data=None, files=None, callback=None, **kw):
+            self.sent.append(uri)
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        kwargs.setdefault('retry_policy', RetryPolicy(backoff=0))
+        return make_pcs(_send, adaptive=False, **kwargs)
+
+    def test_retries_idempotent(self):
+        pcs = self._pcs([requests.exceptions.ReadTimeout(), _response(503),
+                         _response(200, {'total': 1, 'used': 0})])
+        self.assertEqual(json.loads(pcs.quota().content)['total'], 1)
+        self.assertEqual(len(self.sent), 3)
+
+    def test_gives_up_after_retries(self):
+        pcs = self._pcs([_response(503)] * 3, retry_policy=RetryPolicy(retries=2, backoff=0))
+        self.assertEqual(pcs.quota().status_code, 503)
+        self.assertEqual(len(self.sent), 3)
+
+    def test_does_not_repeat_creates(self):
+        cases = [
+            ('mkdir', lambda pcs: pcs.mkdir('/a')),
+            ('rapidupload newcopy', lambda pcs: pcs.rapidupload(
+                None, '/a', fingerprint=_Fingerprint(), ondup='newcopy')),
+        ]
+        for name, call in cases:
+            pcs = self._pcs([requests.exceptions.ReadTimeout()])
+            self.assertRaises(requests.exceptions.ReadTimeout, call, pcs)
+            self.assertEqual(len(self.sent), 1, name)
+
+    def test_rapidupload_overwrite_retries(self):
+        pcs = self._pcs([requests.exceptions.ReadTimeout(), _response(200, {'md5': 'm'})])
+        pcs.rapidupload(None, '/a', fingerprint=_Fingerprint(), ondup='overwrite')
+        self.assertEqual(len(self.sent), 2)
+
+    def test_rate_limit_retries_anything(self):
+        pcs = self._pcs([_response(200, {'errno': 31034}), _response(200, {'errno': 0})])
+        self.assertEqual(json.loads(pcs.mkdir('/a').content)['errno'], 0)
+        self.assertEqual(len(self.sent), 2)
+
+    def test_retry_false(self):
+        pcs = self._pcs([_response(503)])
+        self.assertEqual(pcs.quota(retry=False).status_code, 503)
+        self.assertEqual(len(self.sent), 1)
+
+
+class _Fingerprint(object):
+    size = 1024
+    content_md5 = 'a' * 32
+    slice_md5 = 'b' * 32
+    content_crc32 = 1
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from baidupcsapi.sync import plan_up, plan_down
+
+
+class FakeFingerprint(object):
+    def __init__(self, content_md5):
+        self.content_md5 = content_md5
+
+
+def _fingerprints(md5s):
+    return lambda rel: FakeFingerprint(md5s[rel])
+
+
+def _remote(files=(), dirs=()):
+    """files 为 [(相对路径, 大小, md5, server_mtime)]
+    """
+    return ({rel: {'path': '/r/' + rel, 'size': size, 'md5': md5,
+                   'server_mtime': mtime}
+             for rel, size, md5, mtime in files},
+            {rel: {'path': '/r/' + rel, 'isdir': 1} for rel in dirs})
+
+
+class PlanUpTest(unittest.TestCase):
+
+    cases = [
+        # (说明, 本地 files, 本地 dirs, 远程 files, 远程 dirs, md5, 参数, 计划)
+        ('new file',
+         {'a': (1, 10)}, set(), [], [], {}, {},
+         [('put', 'a')]),
+        ('unchanged, older mtime',
+         {'a': (1, 10)}, set(), [('a', 1, 'm', 20)], [], {}, {},
+         []),
+        ('size changed',
+         {'a': (2, 10)}, set(), [('a', 1, 'm', 20)], [], {}, {},
+         [('put', 'a')]),
+        ('newer mtime, same md5',
+         {'a': (1, 30)}, set(), [('a', 1, 'm', 20)], [], {'a': 'm'}, {},
+         []),
+        ('newer mtime, different md5',
+         {'a': (1, 30)}, set(), [('a', 1, 'm', 20)], [], {'a': 'n'}, {},
+         [('put', 'a')]),
+        ('checksum ignores mtime',
+         {'a': (1, 10)}, set(), [('a', 1, 'm', 20)], [], {'a': 'n'},
+         {'checksum': True},
+         [('put', 'a')]),
+        ('empty dir and parents of puts',
+         {'d/a': (1, 10)}, set(['d', 'e']), [], [], {}, {},
+         [('mkdir', 'e'), ('put', 'd/a')]),
+        ('delete removed, not children of removed dirs',
+         {}, set(), [('x', 1, 'm', 1), ('d/y', 1, 'm', 1)], ['d'], {},
+         {'delete': True},
+         [('delete', 'd'), ('delete', 'x')]),
+        ('no delete without flag',
+         {}, set(), [('x', 1, 'm', 1)], [], {}, {},
+         []),
+        ('move instead of put',
+         {'new/a': (1, 10)}, set(['new']), [('old/a', 1, 'm', 1)], ['old'],
+         {'new/a': 'm'}, {'delete': True},
+         [('mkdir', 'new'), ('move', 'old/a', 'new/a'), ('delete', 'old')]),
+        ('file replaces remote dir',
+         {'d': (1, 10)}, set(), [('d/x', 1, 'm', 1)], ['d'], {}, {},
+         [('delete', 'd'), ('put', 'd')]),
+        ('dir replaces remote file',
+         {}, set(['d']), [('d', 1, 'm', 1)], [], {}, {},
+         [('delete', 'd'), ('mkdir', 'd')]),
+    ]
+
+    def test_plans(self):
+        for (name, local_files, local_dirs, remote_files, remote_dirs, md5s,
+             kwargs, expected) in self.cases:
+            plan = plan_up((local_files, local_dirs),
+                           _remote(remote_files, remote_dirs),
+                           _fingerprints(md5s), **kwargs)
+            self.assertEqual(plan, expected, name)
+
+
+class PlanDownTest(unittest.TestCase):
+
+    cases = [
+        ('new file and dir',
+         [('d/a', 1, 'm', 10)], ['d'], {}, set(), {}, {},
+         [('mkdir', 'd'), ('download', 'd/a')]),
+        ('same size and mtime',
+         [('a', 1, 'm', 10)], [], {'a': (1, 10.0)}, set(), {}, {},
+         []),
+        ('same size, mtime differs, same md5',
+         [('a', 1, 'm', 10)], [], {'a': (1, 5)}, set(), {'a': 'm'}, {},
+         []),
+        ('same size, content differs',
+         [('a', 1, 'm', 10)], [], {'a': (1, 5)}, set(), {'a': 'n'}, {},
+         [('patch', 'a')]),
+        ('size differs',
+         [('a', 2, 'm', 10)], [], {'a': (1, 10)}, set(), {}, {},
+         [('patch', 'a')]),
+        ('checksum ignores mtime',
+         [('a', 1, 'm', 10)], [], {'a': (1, 10)}, set(), {'a': 'n'},
+         {'checksum': True},
+         [('patch', 'a')]),
+        ('delete local extras',
+         [], [], {'x': (1, 1), 'd/y': (1, 1)}, set(['d']), {}, {'delete': True},
+         [('delete', 'd'), ('delete', 'x')]),
+        ('remote file replaces local dir',
+         [('d', 1, 'm', 10)], [], {'d/x': (1, 1)}, set(['d']), {}, {},
+         [('delete', 'd'), ('download', 'd')]),
+    ]
+
+    def test_plans(self):
+        for (name, remote_files, remote_dirs, local_files, local_dirs, md5s,
+             kwargs, expected) in self.cases:
+            plan = plan_down(_remote(remote_files, remote_dirs),
+                             (local_files, local_dirs),
+                             _fingerprints(md5s), **kwargs)
+            self.assertEqual(plan, expected, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import hashlib
+import shutil
+import tempfile
+import unittest
+
+from baidupcsapi import PCSError
+from baidupcsapi.journal import UploadJournal
+from tests.fake import FakeServer, make_pcs, response
+
+
+class UploadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.server = FakeServer()
+        self.pcs = make_pcs(self.server)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _local(self, content, name='a.bin'):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def _methods(self):
+        return [method for _, method, _ in self.server.calls]
+
+
+class UploadFileTest(UploadTestCase):
+
+    def test_blocks(self):
+        content = ''.join(chr(i % 251) for i in xrange(5000))
+        done = []
+
+        def callback(size, progress):
+            done.append((size, progress))
+        ret = self.pcs.upload_file(self._local(content), '/r/a.bin', block_size=1024,
+                                   callback=callback)
+        self.assertTrue(ret.ok)
+        self.assertEqual(self.server.files['/r/a.bin'], content)
+        self.assertEqual(self._methods().count('upload'), 5)
+        self.assertEqual(max(done), (5000, 5000))
+
+    def test_only_missing_and_distinct_blocks(self):
+        block = 'x' * 1024
+        self.server.blocks[hashlib.md5('y' * 1024).hexdigest()] = 'y' * 1024
+        content = block + 'y' * 1024 + block + 'z'
+        self.pcs.upload_file(self._local(content), '/r/a.bin', block_size=1024)
+        self.assertEqual(self.server.files['/r/a.bin'], content)
+        # 'x' 块只上传一次，服务器已有的 'y' 块不上传
+        self.assertEqual(self._methods().count('upload'), 2)
+
+    def test_single_block_uses_upload(self):
+        self.pcs.upload_file(self._local('small'), '/r/a.bin', block_size=1024)
+        self.assertEqual(self.server.files['/r/a.bin'], 'small')
+        self.assertEqual(self._methods(), ['upload'])
+
+    def test_bad_block_raises(self):
+        def fail(uri, method, host, params, kwargs):
+            if params.get('type') == 'tmpfile':
+                return response({'md5': 'wrong'})
+        self.server.fail = fail
+        self.assertRaises(PCSError, self.pcs.upload_file,
+                          self._local('x' * 3000), '/r/a.bin', block_size=1024)
+        self.assertNotIn('createsuperfile', self._methods())
+
+    def test_resume_reuploads_blocks_server_lost(self):
+        content = 'a' * 1024 + 'b' * 1024 + 'c' * 1024
+        local = self._local(content)
+        journal = UploadJournal(local, '/r/a.bin', 1024)
+        for idx, block in enumerate(('a', 'b')):
+            journal.done(idx, hashlib.md5(block * 1024).hexdigest())
+        # 服务器上只剩下 'a' 块
+        self.server.blocks[hashlib.md5('a' * 1024).hexdigest()] = 'a' * 1024
+        self.pcs.upload_file(local, '/r/a.bin', block_size=1024, resume=True)
+        self.assertEqual(self.server.files['/r/a.bin'], content)
+        self.assertEqual(self._methods().count('upload'), 2)
+        self.assertFalse(os.path.exists(journal.path))
+
+
+class PutTest(UploadTestCase):
+
+    content = ''.join(chr(i % 251) for i in xrange(300 * 1024))
+
+    def _rapidupload_errno(self, errno):
+        def fail(uri, method, host, params, kwargs):
+            if method == 'rapidupload':
+                return response({'errno': errno})
+        self.server.fail = fail
+
+    def test_rapidupload(self):
+        self.server.files['/other.bin'] = self.content
+        how, ret = self.pcs.put(self._local(self.content), '/r/a.bin')
+        self.assertEqual(how, 'rapidupload')
+        self.assertEqual(self.server.files['/r/a.bin'], self.content)
+        self.assertEqual(self._methods(), ['rapidupload'])
+
+    def test_exists(self):
+        self.server.files['/r/a.bin'] = 'old'
+        how, ret = self.pcs.put(self._local(self.content), '/r/a.bin', ondup=None)
+        self.assertEqual(how, 'exists')
+        self.assertEqual(self.server.files['/r/a.bin'], 'old')
+
+    def test_overwrite_falls_back_to_upload(self):
+        self._rapidupload_errno(-8)
+        how, ret = self.pcs.put(self._local(self.content), '/r/a.bin', ondup='overwrite')
+        self.assertEqual(how, 'upload')
+        self.assertEqual(self.server.files['/r/a.bin'], self.content)
+
+    def test_ondup_passed_to_rapidupload(self):
+        self.server.files['/r/a.bin'] = self.content
+        how, ret = self.pcs.put(self._local(self.content), '/r/a.bin', ondup='newcopy')
+        self.assertEqual(how, 'rapidupload')
+        self.assertEqual(self.server.files['/r/a_copy.bin'], self.content)
+
+    def test_small_file(self):
+        how, ret = self.pcs.put(self._local('small'), '/r/a.bin')
+        self.assertEqual(how, 'upload')
+        self.assertEqual(self.server.files['/r/a.bin'], 'small')
+
+    def test_large_file(self):
+        content = self.content * 15
+        how, ret = self.pcs.put(self._local(content), '/r/a.bin')
+        self.assertEqual(how, 'upload_file')
+        self.assertEqual(self.server.files['/r/a.bin'], content)
+
+    def test_other_error(self):
+        self._rapidupload_errno(-7)
+        self.assertRaises(PCSError, self.pcs.put, self._local(self.content), '/r/a.bin')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+
+import requests
+
+from baidupcsapi import PCSError
+
+from tests.fake import make_pcs
+
+TREE = {
+    '/': ['/a', '/b', '/f'],
+    '/a': ['/a/c', '/a/g'],
+    '/a/c': ['/a/c/h'],
+    '/b': [],
+}
+
+
+def _entry(path):
+    return {'path': path, 'isdir': int(path in TREE)}
+
+
+class WalkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pcs = make_pcs()
+        self.errors = {}
+
+        def _iter_files(path, prefetch=True, **kwargs):
+            if path in self.errors:
+                raise self.errors[path]
+            return iter([_entry(p) for p in TREE[path]])
+        self.pcs.iter_files = _iter_files
+
+    def _walk(self, *args, **kwargs):
+        result = {}
+
+        def _run():
+            try:
+                result['walk'] = list(self.pcs.walk(*args, **kwargs))
+            except Exception as e:
+                result['error'] = e
+        thread = threading.Thread(target=_run)
+        thread.daemon = True
+        thread.start()
+        thread.join(3)
+        self.assertFalse(thread.is_alive(), 'walk hangs')
+        if 'error' in result:
+            raise result['error']
+        return result['walk']
+
+    def test_walk(self):
+        cases = [
+            # (参数, 结果)
+            (dict(ordered=True), [('/', ['/a', '/b'], ['/f']), ('/a', ['/a/c'], ['/a/g']),
+                                  ('/b', [], []), ('/a/c', [], ['/a/c/h'])]),
+            (dict(ordered=True, max_depth=0), [('/', ['/a', '/b'], ['/f'])]),
+            (dict(workers=1), [('/', ['/a', '/b'], ['/f']), ('/a', ['/a/c'], ['/a/g']),
+                               ('/b', [], []), ('/a/c', [], ['/a/c/h'])]),
+        ]
+        for kwargs, expected in cases:
+            walk = [(path, [d['path'] for d in dirs], [f['path'] for f in files])
+                    for path, dirs, files in self._walk('/', **kwargs)]
+            if not kwargs.get('ordered') and kwargs.get('workers') != 1:
+                walk.sort()
+            self.assertEqual(walk, expected, kwargs)
+
+    def test_unordered_visits_everything(self):
+        paths = sorted(path for path, dirs, files in self._walk('/', workers=4))
+        self.assertEqual(paths, ['/', '/a', '/a/c', '/b'])
+
+    def test_prune(self):
+        paths = []
+        for path, dirs, files in self.pcs.walk('/', ordered=True):
+            paths.append(path)
+            dirs[:] = [d for d in dirs if d['path'] != '/a']
+        self.assertEqual(paths, ['/', '/b'])
+
+    def test_errors(self):
+        cases = [
+            (PCSError('not found'), False),
+            (requests.ConnectionError('boom'), True),
+            (ValueError('bad json'), True),
+        ]
+        for error, raises in cases:
+            for ordered in (False, True):
+                self.errors = {'/a': error}
+                if raises:
+                    self.assertRaises(type(error), self._walk, '/', ordered=ordered)
+                else:
+                    paths = sorted(p for p, d, f in self._walk('/', ordered=ordered))
+                    self.assertEqual(paths, ['/', '/b'])
+                reported = []
+                paths = sorted(p for p, d, f in self._walk('/', ordered=ordered,
+                                                            onerror=reported.append))
+                self.assertEqual((paths, reported), (['/', '/b'], [error]))
+
+    def test_does_not_touch_pools(self):
+        adapters = list(self.pcs._adapters)
+        self._walk('/', workers=64)
+        self.assertEqual(self.pcs._adapters, adapters)
+
+
+if __name__ == '__main__':
+    unittest.main()